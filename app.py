@@ -1,30 +1,111 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import sqlite3
 import numpy as np
 import json
 import os
 import io
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import torch
-from transformers import CLIPProcessor, CLIPModel
+from transformers import CLIPProcessor, CLIPModel, CLIPTokenizerFast
 import faiss
 from typing import List, Optional
 from googletrans import Translator
 
+# orjson is optional; it makes FastAPI's JSON encoding several times faster
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse
+
+    _HAS_ORJSON = True
+except Exception:
+    _HAS_ORJSON = False
+
+# Optional GPU image decode/preprocess (falls back to PIL + CLIPProcessor)
+try:
+    from torchvision.io import decode_image, decode_jpeg, ImageReadMode
+    from torchvision.transforms import v2
+
+    _HAS_TORCHVISION = True
+except Exception:
+    _HAS_TORCHVISION = False
+
+# fastText language ID is optional; it lets English queries skip googletrans
+try:
+    import fasttext
+
+    _HAS_FASTTEXT = True
+except Exception:
+    _HAS_FASTTEXT = False
+
 # from pydantic import BaseModel  # Not needed since we use plain dicts
 import uvicorn
 
 # Configuration - Updated to match file 2's database structure
 DATABASE_FILE = "D:/keyframe_embeddings_clip.db"
-FAISS_INDEX_FILE = "D:/keyframe_faiss_clip.index"
-FAISS_ID_MAP_FILE = "D:/keyframe_faiss_map_clip.json"
+FAISS_ID_MAP_FILE = "D:/keyframe_faiss_map_clip.npy"  # int64, mmapped at startup
+FAISS_ID_MAP_JSON_FILE = "D:/keyframe_faiss_map_clip.json"  # Legacy format
+EMBEDDINGS_FILE = "D:/keyframe_embeddings_clip.npy"  # Normalized vectors, FAISS id order
 EMBEDDING_DIM = 1280  # Adjust based on your embeddings
+
+# FAISS index type: "flat" (exact), "hnsw" (graph ANN), "sq8" (int8 codes),
+# "sqfp16" (fp16 codes) or "ivfpq" (compressed ANN).
+# int8 lives only inside the index: "sq8" keeps a quarter of the fp32 bytes
+# resident and scanned, and reranks against EMBEDDINGS_FILE. It is not the
+# default because it is still a linear scan per query, where HNSW's cost
+# grows sublinearly. SQLite keeps fp16/fp32 BLOBs, which are the source for
+# rebuilds and for the exact per-video scores
+FAISS_INDEX_TYPE = "hnsw"
+# Index file is versioned by type so switching types forces a rebuild
+FAISS_INDEX_FILE = f"D:/keyframe_faiss_clip_{FAISS_INDEX_TYPE}.index"
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16
+IVF_TRAIN_SAMPLE = 256  # Training vectors per IVF list
+IVFPQ_M = 32  # PQ sub-quantizers, i.e. bytes per vector code
+IVFPQ_MIN_VECTORS = 50_000  # Smaller collections keep an exact flat index
+IVFPQ_OPQ = True  # Rotate with OPQ first so PQ sub-vectors carry balanced energy
+# Quantized indexes fetch k * factor candidates and re-score them exactly
+# against the fp32 vectors in EMBEDDINGS_FILE
+FAISS_RERANK_FACTOR = 4
 CLIP_MODEL_NAME = "laion/CLIP-ViT-bigG-14-laion2B-39B-b160k"
 
-app = FastAPI(title="Image Retrieval API", version="1.0.0")
+# Micro-batching of concurrent encode requests
+CLIP_MAX_BATCH = 32  # Max queries coalesced into one CLIP forward pass
+# Compiled encoders only ever see these batch sizes: each micro-batch is
+# padded up to the next bucket, and every bucket is captured at startup
+CLIP_BATCH_BUCKETS = (1, 2, 4, 8, 16, CLIP_MAX_BATCH)
+CLIP_MAX_WAIT_MS = 8  # Max time the first queued query waits for company
+TEXT_EMBEDDING_CACHE_SIZE = 4096  # LRU entries of encoded text queries
+TRANSLATION_CACHE_SIZE = 4096  # LRU entries of translated queries
+VIDEO_EMBEDDING_CACHE_SIZE = 512  # LRU entries of per-video embedding matrices
+FAISS_MAX_BATCH = 64  # Max query vectors stacked into one FAISS search
+FAISS_MAX_WAIT_MS = 2
+FAISS_GPU_MIN_VECTORS = 200_000  # Mirror the index on GPU above this size
+FAISS_GPU_MIN_BATCH = 8  # Smaller batches stay on CPU (transfer not amortized)
+FAISS_GPU_TEMP_MEMORY = 512 * 1024 * 1024
+CLIP_COMPILE = True  # torch.compile the CLIP encoders on CUDA at startup
+CLIP_TEXT_MAX_LENGTH = 77  # CLIP text context length
+# Per-request trace lines (errors and startup status always print). Off by
+# default: every print takes the stdout lock inside the request path
+REQUEST_TRACE = False
+LID_MODEL_FILE = "lid.176.ftz"  # fastText language ID model (~1 MB)
+LID_MIN_CONFIDENCE = 0.6  # Below this, fall back to googletrans detection
+IMAGE_DECODE_WORKERS = max(1, (os.cpu_count() or 2) // 2)  # Upload decode threads
+VIDEO_FETCH_WORKERS = 4  # Concurrent per-video SQLite reads (fallback path)
+
+app = FastAPI(
+    title="Image Retrieval API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse if _HAS_ORJSON else JSONResponse,
+)
 
 # CORS middleware
 app.add_middleware(
@@ -38,53 +119,447 @@ app.add_middleware(
 # Global variables
 clip_model = None
 clip_processor = None
+clip_tokenizer = None  # Rust-backed fast tokenizer for the text path
+clip_image_encoder = None  # get_image_features, compiled when possible
+clip_text_encoder = None  # get_text_features, compiled when possible
+clip_encoders_compiled = False  # True once the compiled encoders are warmed up
+clip_image_transform = None  # torchvision resize/crop/normalize on device
 faiss_index = None
-faiss_id_map = None
+faiss_id_map = None  # np.int64 array: FAISS position -> DB id
+metadata_store = None  # KeyframeMetadataStore for DB-free global searches
+embedding_matrix = None  # mmapped fp32 vectors from EMBEDDINGS_FILE, FAISS order
+video_positions = {}  # video_id -> FAISS positions in keyframe_n order
+faiss_index_gpu = None  # GPU mirror of faiss_index for large batches
+faiss_gpu_resources = None
 translator = None
+lid_model = None  # fastText language identifier, when available
 device = "cuda" if torch.cuda.is_available() else "cpu"
-video_embeddings_cache = {}  # Cache for video-specific embeddings
+clip_dtype = torch.float32  # Lowered to fp16/bf16 on CUDA in load_clip_model
+video_embeddings_cache = OrderedDict()  # LRU: video_id -> (embeddings, ids)
+# get_video_embeddings runs on executor threads, so LRU reorders are locked
+video_embeddings_lock = threading.Lock()
+text_embedding_cache = OrderedDict()  # LRU: normalized query -> embedding
+translation_cache = OrderedDict()  # LRU: (text, target, source) -> translation
+translation_cache_lock = threading.Lock()  # translate_text runs on executor threads
+text_batcher = None  # BatchScheduler for /search/text encodes
+image_batcher = None  # BatchScheduler for /search/image encodes
+faiss_batcher = None  # BatchScheduler for faiss_index.search
+# CLIP encodes run on one thread: torch.compile's CUDA graphs are recorded
+# per thread, so a single thread captures each bucket exactly once
+clip_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clip")
+# FAISS parallelizes over the query batch itself, one dispatch thread is enough
+faiss_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="faiss")
+# PIL and nvJPEG release the GIL while decoding/resizing, so threads run
+# concurrent uploads in parallel without pickling tensors across processes
+image_executor = ThreadPoolExecutor(
+    max_workers=IMAGE_DECODE_WORKERS, thread_name_prefix="image-decode"
+)
+# Each thread reads through its own pooled WAL connection
+video_fetch_executor = ThreadPoolExecutor(
+    max_workers=VIDEO_FETCH_WORKERS, thread_name_prefix="video-fetch"
+)
 
 # We'll use plain dictionaries instead of Pydantic models for response data
 # to avoid serialization issues
 
 
+def trace(message):
+    """Print a per-request trace line when REQUEST_TRACE is enabled"""
+    if REQUEST_TRACE:
+        print(message)
+
+
 # Database utilities
 def adapt_array(arr):
     return arr.tobytes()
 
 
 def convert_array(text):
+    # Embeddings are float32 (zero-copy read-only view over the BLOB bytes)
+    # or float16 (half the page cache), which is widened to float32 here
+    if len(text) == EMBEDDING_DIM * 2:
+        return np.frombuffer(text, dtype=np.float16).astype(np.float32)
     return np.frombuffer(text, dtype=np.float32)
 
 
 sqlite3.register_adapter(np.ndarray, adapt_array)
-sqlite3.register_converter("array", convert_array)
+
+# Every keyframe column except the embedding BLOB. Read endpoints query the
+# keyframe_metadata copy of these columns so the 5 KB vector never goes
+# through the page cache; keyframe_embeddings is only read to (re)build FAISS
+KEYFRAME_METADATA_KEYS = (
+    "id",
+    "video_id",
+    "keyframe_n",
+    "image_filename",
+    "image_path",
+    "pts_time",
+    "fps",
+    "frame_idx",
+    "video_title",
+    "video_author",
+    "video_description",
+    "video_length",
+    "publish_date",
+    "watch_url",
+    "thumbnail_url",
+)
+KEYFRAME_METADATA_COLUMNS = ", ".join(KEYFRAME_METADATA_KEYS)
+# Search results are plain tuples zipped once against these keys, avoiding
+# per-field sqlite3.Row lookups
+KEYFRAME_RESULT_KEYS = KEYFRAME_METADATA_KEYS + ("similarity",)
+# Columns that are identical for every keyframe of a video
+VIDEO_METADATA_KEYS = (
+    "video_title",
+    "video_author",
+    "video_description",
+    "video_length",
+    "publish_date",
+    "watch_url",
+    "thumbnail_url",
+)
+FRAME_METADATA_KEYS = tuple(
+    key for key in KEYFRAME_METADATA_KEYS if key not in VIDEO_METADATA_KEYS
+)
+
+
+# One long-lived connection per thread; sqlite3 keeps compiled statements
+# cached per connection, so reusing it also reuses prepared statements
+_conn_pool = threading.local()
+
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",  # 256 MB
+    "PRAGMA cache_size=-65536",  # 64 MB
+    "PRAGMA temp_store=MEMORY",
+)
 
 
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE_FILE, detect_types=sqlite3.PARSE_DECLTYPES)
+    conn = getattr(_conn_pool, "conn", None)
+    if conn is None:
+        # No detect_types: metadata reads never pay for the "array"
+        # converter, and the few embedding reads call convert_array directly
+        conn = sqlite3.connect(DATABASE_FILE, cached_statements=256)
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        _conn_pool.conn = conn
     conn.row_factory = sqlite3.Row
     return conn
 
 
+class BatchScheduler:
+    """Coalesce concurrent single-item requests into one batched call.
+
+    Callers ``await submit(item)``; a background task drains up to
+    ``max_batch`` queued items (waiting at most ``max_wait_ms`` after the
+    first one), runs ``batch_fn(items)`` once in a worker thread and resolves
+    each caller's future with its row of the result.
+    """
+
+    def __init__(
+        self,
+        batch_fn,
+        max_batch=CLIP_MAX_BATCH,
+        max_wait_ms=CLIP_MAX_WAIT_MS,
+        executor=None,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+        self.queue = None
+        self.task = None
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        if self.task is None:
+            # Not started (e.g. app imported without startup) - run unbatched
+            results = await loop.run_in_executor(self.executor, self.batch_fn, [item])
+            return results[0]
+
+        future = loop.create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self.batch_fn, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+def metadata_table_stale():
+    """True when keyframe_metadata is missing or out of step with keyframe_embeddings.
+
+    Compares COUNT(*) and MAX(id), so a re-ingest into an existing database
+    is picked up at the next startup instead of serving the old snapshot.
+    """
+    conn = get_db_connection()
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'keyframe_metadata'"
+    ).fetchone()
+    if not exists:
+        return True
+    live = conn.execute("SELECT COUNT(*), MAX(id) FROM keyframe_embeddings").fetchone()
+    snapshot = conn.execute("SELECT COUNT(*), MAX(id) FROM keyframe_metadata").fetchone()
+    return tuple(live) != tuple(snapshot)
+
+
+def ensure_metadata_table(rebuild=False):
+    """Create keyframe_metadata, a BLOB-free copy of keyframe_embeddings"""
+    conn = get_db_connection()
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'keyframe_metadata'"
+    ).fetchone()
+    if exists and not rebuild:
+        return
+
+    print("Creating keyframe_metadata table...")
+    conn.execute("DROP TABLE IF EXISTS keyframe_metadata")
+    conn.execute(
+        f"CREATE TABLE keyframe_metadata AS "
+        f"SELECT {KEYFRAME_METADATA_COLUMNS} FROM keyframe_embeddings ORDER BY id"
+    )
+    conn.execute("CREATE UNIQUE INDEX idx_meta_id ON keyframe_metadata (id)")
+    conn.commit()
+
+
+def ensure_video_counts_table(rebuild=False):
+    """Create video_frame_counts, per-video keyframe counts backing /stats.
+
+    Counted once from the keyframe_metadata snapshot and rebuilt whenever it
+    is (including the startup freshness check), so /stats reads one small
+    table instead of scanning every keyframe.
+    """
+    conn = get_db_connection()
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'video_frame_counts'"
+    ).fetchone()
+    if exists and not rebuild:
+        return
+
+    conn.execute("DROP TABLE IF EXISTS video_frame_counts")
+    conn.execute(
+        "CREATE TABLE video_frame_counts (video_id TEXT PRIMARY KEY, frame_count INTEGER)"
+    )
+    conn.execute(
+        "INSERT INTO video_frame_counts "
+        "SELECT video_id, COUNT(*) FROM keyframe_metadata GROUP BY video_id"
+    )
+    conn.commit()
+
+
+def ensure_db_indexes(refresh_stats=False):
+    """Create the (video_id, keyframe_n) indexes used by range reads.
+
+    Planner statistics only change after an ingest, so ANALYZE (a full scan)
+    runs only when an index is created or refresh_stats is set, i.e. after
+    the metadata snapshot was rebuilt.
+    """
+    conn = get_db_connection()
+    existing = {
+        row[0]
+        for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' "
+            "AND name IN ('idx_kf_vid_n', 'idx_meta_vid_n_frames')"
+        )
+    }
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_kf_vid_n ON keyframe_embeddings (video_id, keyframe_n)"
+    )
+    # Covers the /frames/surrounding range read, so it never touches the table
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_meta_vid_n_frames ON keyframe_metadata "
+        "(video_id, keyframe_n, image_filename, image_path, pts_time)"
+    )
+    if refresh_stats or len(existing) < 2:
+        conn.execute("ANALYZE")
+    conn.commit()
+
+
 # Model loading functions
 def load_clip_model():
-    global clip_model, clip_processor
+    global clip_model, clip_processor, clip_tokenizer, clip_dtype
     try:
         print(f"Loading CLIP model: {CLIP_MODEL_NAME}")
         clip_processor = CLIPProcessor.from_pretrained(CLIP_MODEL_NAME)
-        clip_model = CLIPModel.from_pretrained(CLIP_MODEL_NAME)
+        clip_tokenizer = CLIPTokenizerFast.from_pretrained(CLIP_MODEL_NAME)
+        if device == "cuda":
+            # Half precision enables Tensor Cores for the ViT matmuls
+            clip_dtype = (
+                torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+            )
+        # Load straight into clip_dtype so bigG's fp32 weights are never
+        # materialized, with fused SDPA attention where transformers has it
+        try:
+            clip_model = CLIPModel.from_pretrained(
+                CLIP_MODEL_NAME, torch_dtype=clip_dtype, attn_implementation="sdpa"
+            )
+        except (TypeError, ValueError, ImportError):
+            clip_model = CLIPModel.from_pretrained(CLIP_MODEL_NAME, torch_dtype=clip_dtype)
         clip_model = clip_model.to(device)
+        if device == "cuda":
+            clip_model = clip_model.to(memory_format=torch.channels_last)
         clip_model.eval()
-        print(f"CLIP model loaded successfully on {device}")
+        print(f"CLIP model loaded successfully on {device} ({clip_dtype})")
+        build_image_transform()
+        compile_clip_encoders()
     except Exception as e:
         print(f"Error loading CLIP model: {e}")
         raise e
 
 
+def build_image_transform():
+    """Mirror CLIPProcessor's image pipeline with torchvision ops on uint8 tensors"""
+    global clip_image_transform
+    if not _HAS_TORCHVISION:
+        return
+
+    image_processor = clip_processor.image_processor
+    crop = image_processor.crop_size
+    clip_image_transform = v2.Compose(
+        [
+            v2.Resize(
+                image_processor.size["shortest_edge"],
+                interpolation=v2.InterpolationMode.BICUBIC,
+                antialias=True,
+            ),
+            v2.CenterCrop((crop["height"], crop["width"])),
+            v2.ToDtype(torch.float32, scale=True),
+            v2.Normalize(mean=image_processor.image_mean, std=image_processor.image_std),
+        ]
+    )
+
+
+def decode_image_on_device(image_data):
+    """Decode uploaded bytes and preprocess them on device.
+
+    JPEGs are decoded with nvJPEG on CUDA; other formats are decoded on CPU
+    and moved over. Returns None when torchvision is unavailable or cannot
+    decode the file, so the caller can fall back to PIL.
+    """
+    if clip_image_transform is None:
+        return None
+
+    try:
+        buf = torch.frombuffer(bytearray(image_data), dtype=torch.uint8)
+        if device == "cuda" and image_data[:2] == b"\xff\xd8":
+            image = decode_jpeg(buf, mode=ImageReadMode.RGB, device=device)
+        else:
+            image = decode_image(buf, mode=ImageReadMode.RGB).to(device)
+        return clip_image_transform(image)
+    except Exception as e:
+        print(f"torchvision decode failed, falling back to PIL: {e}")
+        return None
+
+
+def load_query_image(image_data):
+    """Decode and preprocess uploaded bytes into a pixel tensor (runs on image_executor)"""
+    image = decode_image_on_device(image_data)
+    if image is None:
+        image = Image.open(io.BytesIO(image_data)).convert("RGB")
+        image = clip_processor(images=image, return_tensors="pt")["pixel_values"][0]
+    return image
+
+
+def compile_clip_encoders():
+    """Wrap the CLIP encoders with torch.compile and warm them up.
+
+    Warm-up runs every CLIP_BATCH_BUCKETS size on clip_executor, the thread
+    that serves encodes, so compilation and CUDA graph capture happen
+    before the first request. Falls back to the eager methods on CPU, on
+    torch builds without torch.compile, or if compilation fails.
+    """
+    global clip_image_encoder, clip_text_encoder, clip_encoders_compiled
+    clip_image_encoder = clip_model.get_image_features
+    clip_text_encoder = clip_model.get_text_features
+    clip_encoders_compiled = False
+
+    if not CLIP_COMPILE or device != "cuda" or not hasattr(torch, "compile"):
+        return
+
+    try:
+        image_encoder = torch.compile(
+            clip_model.get_image_features, mode="reduce-overhead", fullgraph=False
+        )
+        text_encoder = torch.compile(
+            clip_model.get_text_features, mode="reduce-overhead", fullgraph=False
+        )
+        clip_executor.submit(warm_up_clip_encoders, image_encoder, text_encoder).result()
+
+        clip_image_encoder = image_encoder
+        clip_text_encoder = text_encoder
+        clip_encoders_compiled = True
+        print(f"CLIP encoders compiled with torch.compile (batches {CLIP_BATCH_BUCKETS})")
+    except Exception as e:
+        print(f"torch.compile unavailable, using eager CLIP encoders: {e}")
+
+
+def warm_up_clip_encoders(image_encoder, text_encoder):
+    """Run both compiled encoders at every bucket size (on clip_executor)"""
+    crop = clip_processor.image_processor.crop_size
+    with torch.inference_mode():
+        for batch in CLIP_BATCH_BUCKETS:
+            dummy_pixels = torch.zeros(
+                (batch, 3, crop["height"], crop["width"]),
+                dtype=clip_dtype,
+                device=device,
+            ).to(memory_format=torch.channels_last)
+            dummy_ids = torch.ones(
+                (batch, CLIP_TEXT_MAX_LENGTH), dtype=torch.long, device=device
+            )
+            # reduce-overhead records the graph on the second call per shape
+            for _ in range(3):
+                image_encoder(pixel_values=dummy_pixels)
+                text_encoder(input_ids=dummy_ids, attention_mask=torch.ones_like(dummy_ids))
+    torch.cuda.synchronize()
+
+
+def pad_to_bucket(tensor):
+    """Pad a batch up to the next CLIP_BATCH_BUCKETS size by repeating row 0.
+
+    Only the compiled encoders need fixed shapes; eager batches pass through.
+    Callers slice the first len(batch) output rows back out.
+    """
+    n = tensor.shape[0]
+    if not clip_encoders_compiled or n >= CLIP_MAX_BATCH:
+        return tensor
+    bucket = next(b for b in CLIP_BATCH_BUCKETS if b >= n)
+    if bucket == n:
+        return tensor
+    return torch.cat([tensor, tensor[:1].expand(bucket - n, *tensor.shape[1:])])
+
+
 def initialize_translator():
-    """Initialize Google Translator"""
-    global translator
+    """Initialize Google Translator and the local language identifier"""
+    global translator, lid_model
     try:
         translator = Translator()
         print("Google Translator initialized successfully")
@@ -92,39 +567,244 @@ def initialize_translator():
         print(f"Error initializing translator: {e}")
         translator = None
 
+    if _HAS_FASTTEXT and os.path.exists(LID_MODEL_FILE):
+        try:
+            lid_model = fasttext.load_model(LID_MODEL_FILE)
+            print("fastText language ID loaded")
+        except Exception as e:
+            print(f"Error loading fastText language ID: {e}")
+            lid_model = None
+
+
+def detect_language(text):
+    """Detect the language locally with fastText; None when unsure or unavailable"""
+    if lid_model is None:
+        return None
+    try:
+        labels, probs = lid_model.predict(text.replace("\n", " "), k=1)
+    except Exception:
+        return None
+    if not labels or probs[0] < LID_MIN_CONFIDENCE:
+        return None
+    return labels[0].replace("__label__", "")
+
+
+def cache_translation(key, result):
+    """Insert into the translation LRU, evicting the least recently used entry"""
+    with translation_cache_lock:
+        translation_cache[key] = result
+        if len(translation_cache) > TRANSLATION_CACHE_SIZE:
+            translation_cache.popitem(last=False)
+    return result
+
 
 def translate_text(text, target_lang="en", source_lang="auto"):
-    """Translate text to target language"""
+    """Translate text to target language.
+
+    googletrans outcomes are memoized in an LRU cache; failures are not,
+    so a transient error is retried on the next request.
+    """
     global translator
+    # Local detection (<1 ms) spares the common already-English query the
+    # googletrans detect + translate round trips. fastText labels are only
+    # used for that short circuit, never passed on as src: some of them
+    # (e.g. "zh") are not googletrans language codes
+    detected_lang = source_lang if source_lang != "auto" else detect_language(text)
+    if detected_lang == target_lang:
+        return text, False
+
     if translator is None:
         return text, False  # Return original text if translator not available
 
+    key = (text.strip(), target_lang, source_lang)
+    with translation_cache_lock:
+        cached = translation_cache.get(key)
+        if cached is not None:
+            translation_cache.move_to_end(key)
+            return cached
+
     try:
         # Detect if text is already in English (or target language)
-        detection = translator.detect(text)
-        if detection.lang == target_lang:
-            return text, False
+        if detected_lang is None:
+            detected_lang = translator.detect(text).lang
+            if detected_lang == target_lang:
+                return cache_translation(key, (text, False))
 
         # Translate text
         result = translator.translate(text, src=source_lang, dest=target_lang)
-        print(
-            f"Translated '{text}' from {detection.lang} to {target_lang}: '{result.text}'"
-        )
-        return result.text, True
+        trace(f"Translated '{text}' from {detected_lang} to {target_lang}: '{result.text}'")
+        return cache_translation(key, (result.text, True))
     except Exception as e:
         print(f"Translation error: {e}")
         return text, False  # Return original text if translation fails
 
 
+def create_faiss_index(embeddings_np):
+    """Create and fill a FAISS index of FAISS_INDEX_TYPE over normalized vectors"""
+    n, d = embeddings_np.shape
+
+    if FAISS_INDEX_TYPE == "ivfpq":
+        nlist = max(1, int(4 * np.sqrt(n)))
+        m = IVFPQ_M
+        if n >= IVFPQ_MIN_VECTORS and d % m == 0:
+            quantizer = faiss.IndexFlatIP(d)
+            index = faiss.IndexIVFPQ(
+                quantizer, d, nlist, m, 8, faiss.METRIC_INNER_PRODUCT
+            )
+            if IVFPQ_OPQ:
+                # Orthogonal rotation, so inner products are preserved
+                index = faiss.IndexPreTransform(faiss.OPQMatrix(d, m), index)
+            sample_size = min(n, nlist * IVF_TRAIN_SAMPLE)
+            sample = embeddings_np[
+                np.random.default_rng(0).choice(n, sample_size, replace=False)
+            ]
+            label = "OPQ+IVFPQ" if IVFPQ_OPQ else "IVFPQ"
+            print(f"Training {label} (nlist={nlist}, m={m}) on {sample_size} vectors")
+            index.train(sample)
+            index.add(embeddings_np)
+            return index
+        print(f"Only {n} vectors, using an exact flat index instead of IVFPQ")
+        index = faiss.IndexFlatIP(d)
+        index.add(embeddings_np)
+        return index
+
+    if FAISS_INDEX_TYPE in ("sq8", "sqfp16"):
+        # 1 (int8) or 2 (fp16) bytes per dimension instead of 4: a quarter or
+        # half of the memory traffic of a flat fp32 scan
+        qtype = (
+            faiss.ScalarQuantizer.QT_8bit
+            if FAISS_INDEX_TYPE == "sq8"
+            else faiss.ScalarQuantizer.QT_fp16
+        )
+        index = faiss.IndexScalarQuantizer(d, qtype, faiss.METRIC_INNER_PRODUCT)
+        index.train(embeddings_np)
+        index.add(embeddings_np)
+        return index
+
+    if FAISS_INDEX_TYPE == "hnsw":
+        index = faiss.IndexHNSWFlat(d, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.add(embeddings_np)
+        return index
+
+    index = faiss.IndexFlatIP(d)  # Inner product for cosine similarity
+    index.add(embeddings_np)
+    return index
+
+
+def unwrap_faiss_index(index):
+    """Return the index beneath an OPQ IndexPreTransform, else the index itself"""
+    if isinstance(index, faiss.IndexPreTransform):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def configure_faiss_index(index):
+    """Apply query-time search parameters for ANN indexes"""
+    index = unwrap_faiss_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = IVF_NPROBE
+
+
+class MemmapFlatIndex:
+    """Exact inner-product search directly over a memory-mapped matrix.
+
+    For a flat index the index *is* the matrix, so rather than deserializing
+    a copy into FAISS the OS pages EMBEDDINGS_FILE in on demand and queries
+    go through faiss.knn. Exposes the part of the faiss.Index API used here.
+    """
+
+    def __init__(self, xb):
+        self.xb = xb
+        self.ntotal, self.d = xb.shape
+
+    def search(self, x, k):
+        return faiss.knn(x, self.xb, k, metric=faiss.METRIC_INNER_PRODUCT)
+
+
+def gpu_cloner_options():
+    """Cloner options that let the default IVFPQ fit GPU IVFPQ limits.
+
+    fp16 PQ lookup tables halve their shared-memory footprint, and
+    precomputed tables are required for IVFPQ_M=32 (40 dims per
+    sub-quantizer, a width the direct GPU kernels don't support).
+    """
+    co = faiss.GpuClonerOptions()
+    co.useFloat16 = True
+    co.usePrecomputed = True
+    return co
+
+
+def move_faiss_index_to_gpu():
+    """Mirror faiss_index on GPU 0 when faiss-gpu, CUDA and a large index are present.
+
+    The CPU index stays authoritative and serves small batches; index types
+    FAISS cannot clone to GPU (e.g. HNSW) simply stay CPU-only.
+    """
+    global faiss_index_gpu, faiss_gpu_resources
+    faiss_index_gpu = None
+    if (
+        not hasattr(faiss, "StandardGpuResources")
+        or not torch.cuda.is_available()
+        or faiss_index.ntotal < FAISS_GPU_MIN_VECTORS
+    ):
+        return
+
+    try:
+        cpu_index = faiss_index
+        if isinstance(cpu_index, MemmapFlatIndex):
+            cpu_index = faiss.IndexFlatIP(faiss_index.d)
+            cpu_index.add(faiss_index.xb)
+        if faiss_gpu_resources is None:
+            faiss_gpu_resources = faiss.StandardGpuResources()
+            faiss_gpu_resources.setTempMemory(FAISS_GPU_TEMP_MEMORY)
+        faiss_index_gpu = faiss.index_cpu_to_gpu(
+            faiss_gpu_resources, 0, cpu_index, gpu_cloner_options()
+        )
+        # Let GPU indexes search torch tensors that already live on the device
+        import faiss.contrib.torch_utils  # noqa: F401
+        if isinstance(unwrap_faiss_index(cpu_index), faiss.IndexIVF):
+            # The clone does not reliably carry query-time parameters over
+            faiss.GpuParameterSpace().set_index_parameter(
+                faiss_index_gpu, "nprobe", IVF_NPROBE
+            )
+        print(f"FAISS index mirrored on GPU: {faiss_index_gpu.ntotal} vectors")
+    except Exception as e:
+        print(f"Keeping FAISS index on CPU only: {e}")
+
+
+def load_faiss_index():
+    """Open the persisted index: the mmapped matrix for flat, else the FAISS file"""
+    if FAISS_INDEX_TYPE == "flat":
+        return MemmapFlatIndex(embedding_matrix)
+
+    index = faiss.read_index(FAISS_INDEX_FILE)
+    configure_faiss_index(index)
+    return index
+
+
+def load_faiss_id_map():
+    """Memory-map the FAISS position -> DB id array, converting a legacy JSON map once"""
+    if not os.path.exists(FAISS_ID_MAP_FILE):
+        with open(FAISS_ID_MAP_JSON_FILE, "r") as f:
+            np.save(FAISS_ID_MAP_FILE, np.asarray(json.load(f), dtype=np.int64))
+    return np.load(FAISS_ID_MAP_FILE, mmap_mode="r")
+
+
 def build_faiss_index():
-    global faiss_index, faiss_id_map
+    global faiss_index, faiss_id_map, embedding_matrix
 
     # Check if index files exist
-    if os.path.exists(FAISS_INDEX_FILE) and os.path.exists(FAISS_ID_MAP_FILE):
+    index_file = EMBEDDINGS_FILE if FAISS_INDEX_TYPE == "flat" else FAISS_INDEX_FILE
+    has_id_map = os.path.exists(FAISS_ID_MAP_FILE) or os.path.exists(FAISS_ID_MAP_JSON_FILE)
+    if os.path.exists(index_file) and has_id_map:
         try:
-            faiss_index = faiss.read_index(FAISS_INDEX_FILE)
-            with open(FAISS_ID_MAP_FILE, "r") as f:
-                faiss_id_map = json.load(f)
+            if os.path.exists(EMBEDDINGS_FILE):
+                embedding_matrix = np.load(EMBEDDINGS_FILE, mmap_mode="r")
+            faiss_index = load_faiss_index()
+            faiss_id_map = load_faiss_id_map()
             print(f"FAISS index loaded: {faiss_index.ntotal} vectors")
             return
         except Exception as e:
@@ -135,293 +815,564 @@ def build_faiss_index():
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    cursor.execute("SELECT id, embedding FROM keyframe_embeddings ORDER BY id")
-    rows = cursor.fetchall()
+    cursor.execute(
+        "SELECT COUNT(*) FROM keyframe_embeddings WHERE embedding IS NOT NULL"
+    )
+    count = cursor.fetchone()[0]
 
-    if not rows:
+    if count == 0:
         print("No embeddings found in database")
-        conn.close()
         return
 
-    embeddings = []
-    ids = []
+    # Stream rows straight into a preallocated matrix instead of a Python list
+    embeddings_np = np.empty((count, EMBEDDING_DIM), dtype=np.float32)
+    ids = np.empty(count, dtype=np.int64)
+    n = 0
 
-    for row in rows:
-        db_id = row["id"]
-        embedding = row["embedding"]
-        if embedding is not None and len(embedding) > 0:
-            # Reshape embedding if needed
-            if len(embedding.shape) == 1:
-                embedding = embedding.reshape(1, -1)
-            embeddings.append(embedding.flatten())
-            ids.append(db_id)
-
-    if not embeddings:
+    # Rows arrive as raw bytes (no converter) and are decoded straight into
+    # the preallocated matrix
+    valid_sizes = (EMBEDDING_DIM * 4, EMBEDDING_DIM * 2)  # fp32/fp16
+    cursor.row_factory = None
+    cursor.arraysize = 10000
+    cursor.execute(
+        "SELECT id, embedding FROM keyframe_embeddings "
+        "WHERE embedding IS NOT NULL ORDER BY id"
+    )
+    while True:
+        rows = cursor.fetchmany()
+        if not rows:
+            break
+        for db_id, blob in rows:
+            if len(blob) not in valid_sizes or n >= count:
+                continue
+            embeddings_np[n] = convert_array(blob)
+            ids[n] = db_id
+            n += 1
+
+    if n == 0:
         print("No valid embeddings found")
-        conn.close()
         return
 
-    embeddings_np = np.array(embeddings).astype("float32")
-    print(
-        f"Building index with {len(embeddings)} vectors of dimension {embeddings_np.shape[1]}"
-    )
+    embeddings_np = embeddings_np[:n]
+    ids = ids[:n]
+    print(f"Building index with {n} vectors of dimension {EMBEDDING_DIM}")
 
     # Normalize embeddings for cosine similarity
     faiss.normalize_L2(embeddings_np)
 
-    # Create FAISS index
-    index = faiss.IndexFlatIP(
-        embeddings_np.shape[1]
-    )  # Inner product for cosine similarity
-    index.add(embeddings_np)
+    # Save ID mapping and the raw vectors; for "flat" the vectors are the index
+    np.save(FAISS_ID_MAP_FILE, ids)
+    np.save(EMBEDDINGS_FILE, embeddings_np)
+    embedding_matrix = np.load(EMBEDDINGS_FILE, mmap_mode="r")
 
-    # Save index and ID mapping
-    faiss.write_index(index, FAISS_INDEX_FILE)
-    with open(FAISS_ID_MAP_FILE, "w") as f:
-        json.dump(ids, f)
+    if FAISS_INDEX_TYPE == "flat":
+        del embeddings_np  # Serve from the page cache, not a private copy
+        index = load_faiss_index()
+    else:
+        index = create_faiss_index(embeddings_np)
+        configure_faiss_index(index)
+        faiss.write_index(index, FAISS_INDEX_FILE)
+
+    # Refresh the BLOB-free metadata copy so it matches the new index
+    ensure_metadata_table(rebuild=True)
+    ensure_video_counts_table(rebuild=True)
+    ensure_db_indexes(refresh_stats=True)
 
     faiss_index = index
-    faiss_id_map = ids
+    faiss_id_map = np.load(FAISS_ID_MAP_FILE, mmap_mode="r")
 
     print(f"FAISS index built and saved: {faiss_index.ntotal} vectors")
-    conn.close()
 
 
-def encode_image(image):
-    """Encode image using CLIP model"""
+def features_for_search(features):
+    """float32 features as FAISS wants them: left on device for a GPU index
+    (no device-to-host copy and stream sync per query), numpy otherwise"""
+    features = features.float()
+    if faiss_index_gpu is not None:
+        return features.contiguous()
+    return features.cpu().numpy()
+
+
+def query_to_numpy(query_embedding):
+    """2D float32 numpy copy of a query embedding given as ndarray or tensor"""
+    if isinstance(query_embedding, torch.Tensor):
+        query_embedding = query_embedding.detach().float().cpu().numpy()
+    return np.array(query_embedding, dtype="float32").reshape(1, -1)
+
+
+def preprocess_images(images):
+    """Stack pixel tensors for a batch, running CLIPProcessor only on PIL images"""
+    pil_images = [img for img in images if not isinstance(img, torch.Tensor)]
+    if pil_images:
+        pil_pixels = iter(clip_processor(images=pil_images, return_tensors="pt")["pixel_values"])
+
+    pixel_values = torch.stack(
+        [
+            img.to(device) if isinstance(img, torch.Tensor) else next(pil_pixels).to(device)
+            for img in images
+        ]
+    )
+    return pixel_values.to(dtype=clip_dtype, memory_format=torch.channels_last)
+
+
+def encode_images(images):
+    """Encode a batch of images (PIL or preprocessed tensors), one row per image"""
     if clip_model is None or clip_processor is None:
         raise HTTPException(status_code=500, detail="CLIP model not loaded")
 
     try:
-        inputs = clip_processor(images=image, return_tensors="pt")
-        inputs = {k: v.to(device) for k, v in inputs.items()}
+        pixel_values = preprocess_images(images)
 
-        with torch.no_grad():
-            image_features = clip_model.get_image_features(**inputs)
+        with torch.inference_mode():
+            # Back to float32 before normalizing so FAISS gets exact unit vectors
+            n = pixel_values.shape[0]
+            pixel_values = pad_to_bucket(pixel_values).contiguous(
+                memory_format=torch.channels_last
+            )
+            image_features = clip_image_encoder(pixel_values=pixel_values)[:n].float()
             image_features = image_features / image_features.norm(dim=-1, keepdim=True)
 
-        return image_features.cpu().numpy().astype("float32")
+        return features_for_search(image_features)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error encoding image: {str(e)}")
 
 
-def encode_text(text):
-    """Encode text using CLIP model"""
-    if clip_model is None or clip_processor is None:
+def encode_texts(texts):
+    """Encode a batch of texts using CLIP model, one row per text"""
+    if clip_model is None or clip_tokenizer is None:
         raise HTTPException(status_code=500, detail="CLIP model not loaded")
 
     try:
-        inputs = clip_processor(text=[text], return_tensors="pt", padding=True)
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-
-        with torch.no_grad():
-            text_features = clip_model.get_text_features(**inputs)
+        # Fixed 77-token padding keeps the compiled text encoder on one shape
+        tokens = clip_tokenizer(
+            list(texts),
+            padding="max_length",
+            truncation=True,
+            max_length=CLIP_TEXT_MAX_LENGTH,
+            return_tensors="pt",
+        )
+        input_ids = tokens["input_ids"]
+        attention_mask = tokens["attention_mask"]
+        if device == "cuda":
+            input_ids = input_ids.pin_memory().to(device, non_blocking=True)
+            attention_mask = attention_mask.pin_memory().to(device, non_blocking=True)
+
+        with torch.inference_mode():
+            n = input_ids.shape[0]
+            text_features = clip_text_encoder(
+                input_ids=pad_to_bucket(input_ids),
+                attention_mask=pad_to_bucket(attention_mask),
+            )[:n].float()
             text_features = text_features / text_features.norm(dim=-1, keepdim=True)
 
-        return text_features.cpu().numpy().astype("float32")
+        return features_for_search(text_features)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error encoding text: {str(e)}")
 
 
+def encode_image(image):
+    """Encode a single image using CLIP model"""
+    return encode_images([image])
+
+
+def encode_text(text):
+    """Encode a single text using CLIP model"""
+    return encode_texts([text])
+
+
+def cache_video_embeddings(video_id, embeddings_np, ids):
+    """Insert into the per-video LRU, evicting the least recently used video.
+
+    On CUDA the matrix is uploaded once here, so repeat searches of a video
+    score against a resident tensor instead of re-copying it per request.
+    """
+    embeddings = embeddings_np
+    if device == "cuda":
+        # np.require copies read-only memmap slices, which torch cannot wrap
+        embeddings = torch.from_numpy(np.require(embeddings_np, requirements="W")).to(device)
+    with video_embeddings_lock:
+        video_embeddings_cache[video_id] = (embeddings, ids)
+        video_embeddings_cache.move_to_end(video_id)
+        if len(video_embeddings_cache) > VIDEO_EMBEDDING_CACHE_SIZE:
+            video_embeddings_cache.popitem(last=False)
+    return embeddings, ids
+
+
 def get_video_embeddings(video_id):
     """Get embeddings for a specific video (with caching) - Updated table name"""
-    global video_embeddings_cache
-
-    if video_id in video_embeddings_cache:
-        return video_embeddings_cache[video_id]
+    with video_embeddings_lock:
+        cached = video_embeddings_cache.get(video_id)
+        if cached is not None:
+            video_embeddings_cache.move_to_end(video_id)
+            return cached
+
+    if video_positions:
+        # Rows of the normalized memmap: a zero-copy slice when the video's
+        # keyframes are contiguous in FAISS order, one gather otherwise
+        positions = video_positions.get(video_id)
+        if positions is None:
+            return None, None
+        if np.all(np.diff(positions) == 1):
+            embeddings_np = embedding_matrix[positions[0] : positions[-1] + 1]
+        else:
+            embeddings_np = embedding_matrix[positions]
+        ids = faiss_id_map[positions].tolist()
+        return cache_video_embeddings(video_id, embeddings_np, ids)
 
     conn = get_db_connection()
     cursor = conn.cursor()
+    cursor.row_factory = None  # plain (id, embedding) tuples
     cursor.execute(
         "SELECT id, embedding FROM keyframe_embeddings WHERE video_id = ? ORDER BY keyframe_n",
         (video_id,),
     )
     rows = cursor.fetchall()
-    conn.close()
 
     embeddings = []
     ids = []
-    for row in rows:
-        if row["embedding"] is not None and len(row["embedding"]) > 0:
-            embeddings.append(row["embedding"].flatten())
-            ids.append(row["id"])
+    for db_id, blob in rows:
+        if blob is not None and len(blob) > 0:
+            embeddings.append(convert_array(blob))
+            ids.append(db_id)
 
     if embeddings:
-        embeddings_np = np.array(embeddings).astype("float32")
+        # convert_array already yields float32: one stacking copy, then an
+        # in-place normalize
+        embeddings_np = np.vstack(embeddings)
         faiss.normalize_L2(embeddings_np)
-        video_embeddings_cache[video_id] = (embeddings_np, ids)
-        return embeddings_np, ids
+        return cache_video_embeddings(video_id, embeddings_np, ids)
 
     return None, None
 
 
+# Metadata for a ranked id list in a single fixed-shape statement: the
+# (id, rank, similarity) triples are bound as one JSON array, so SQLite
+# returns rows already in FAISS rank order and the plan is cached across
+# calls no matter how many ids are requested
+RANKED_METADATA_SQL = """
+    WITH q(id, ord, sim) AS (
+        SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'),
+               json_extract(value, '$[2]')
+        FROM json_each(?)
+    )
+    SELECT {columns}, q.sim AS similarity
+    FROM q JOIN keyframe_metadata k ON k.id = q.id
+    ORDER BY q.ord
+    LIMIT ?
+""".format(columns=", ".join(f"k.{key}" for key in KEYFRAME_METADATA_KEYS))
+
+
+def fetch_ranked_metadata(db_ids, similarities, limit):
+    """Return metadata dicts with similarity for db_ids, keeping their order"""
+    ranked = [
+        [db_id, rank, similarity]
+        for rank, (db_id, similarity) in enumerate(zip(db_ids, similarities))
+    ]
+    cursor = get_db_connection().cursor()
+    cursor.row_factory = None  # plain tuples
+    cursor.execute(RANKED_METADATA_SQL, (json.dumps(ranked), limit))
+    return [dict(zip(KEYFRAME_RESULT_KEYS, row)) for row in cursor.fetchall()]
+
+
+class KeyframeMetadataStore:
+    """In-memory struct-of-arrays copy of keyframe_metadata.
+
+    Frame-level fields are column arrays sorted by id, video-level fields
+    are kept once per video, so a result page is a searchsorted + take
+    instead of a SQLite round trip.
+    """
+
+    def __init__(self, rows):
+        columns = list(zip(*rows)) if rows else [() for _ in FRAME_METADATA_KEYS]
+        self.ids = np.asarray(columns[0], dtype=np.int64)
+        self.columns = [np.asarray(col, dtype=object) for col in columns]
+        self.videos = {}
+
+    @classmethod
+    def load(cls):
+        """Read the keyframe_metadata snapshot; startup rebuilds it first if stale"""
+        cursor = get_db_connection().cursor()
+        cursor.row_factory = None
+        cursor.execute(
+            f"SELECT {', '.join(FRAME_METADATA_KEYS)} FROM keyframe_metadata ORDER BY id"
+        )
+        store = cls(cursor.fetchall())
+
+        cursor.execute(
+            f"SELECT video_id, {', '.join(VIDEO_METADATA_KEYS)} "
+            f"FROM keyframe_metadata GROUP BY video_id"
+        )
+        store.videos = {row[0]: row[1:] for row in cursor.fetchall()}
+        return store
+
+    def row(self, db_id):
+        """Full metadata dict for one id in KEYFRAME_METADATA_KEYS order, or None"""
+        position = int(np.searchsorted(self.ids, db_id))
+        if position >= len(self.ids) or self.ids[position] != db_id:
+            return None
+        frame = dict(zip(FRAME_METADATA_KEYS, (col[position] for col in self.columns)))
+        video = self.videos.get(frame["video_id"], (None,) * len(VIDEO_METADATA_KEYS))
+        frame.update(zip(VIDEO_METADATA_KEYS, video))
+        return {key: frame[key] for key in KEYFRAME_METADATA_KEYS}
+
+    def lookup(self, db_ids, similarities, limit):
+        """Metadata dicts with similarity for db_ids, keeping their order"""
+        db_ids = np.asarray(db_ids, dtype=np.int64)
+        positions = np.searchsorted(self.ids, db_ids)
+        positions = np.minimum(positions, len(self.ids) - 1)
+        found = self.ids[positions] == db_ids
+        positions = positions[found][:limit]
+        similarities = np.asarray(similarities)[found][:limit].tolist()
+
+        frame_columns = [col[positions].tolist() for col in self.columns]
+        video_id_index = FRAME_METADATA_KEYS.index("video_id")
+        empty_video = (None,) * len(VIDEO_METADATA_KEYS)
+
+        results = []
+        for frame, similarity in zip(zip(*frame_columns), similarities):
+            result = dict(zip(FRAME_METADATA_KEYS, frame))
+            video = self.videos.get(frame[video_id_index], empty_video)
+            result.update(zip(VIDEO_METADATA_KEYS, video))
+            result["similarity"] = similarity
+            results.append(result)
+        return results
+
+
+def load_metadata_store():
+    """Load keyframe_metadata into memory for the search paths"""
+    global metadata_store
+    metadata_store = KeyframeMetadataStore.load()
+    print(f"Metadata store loaded: {len(metadata_store.ids)} keyframes")
+
+
+def build_video_positions():
+    """Index FAISS positions by video so per-video reads slice embedding_matrix"""
+    global video_positions
+    video_positions = {}
+    if not metadata_store_ready() or embedding_matrix is None or faiss_id_map is None:
+        return
+
+    # faiss_id_map is in ascending id order, as is the metadata store
+    ids = metadata_store.ids
+    positions = np.minimum(np.searchsorted(faiss_id_map, ids), len(faiss_id_map) - 1)
+    has_vector = faiss_id_map[positions] == ids
+    video_ids = metadata_store.columns[FRAME_METADATA_KEYS.index("video_id")][has_vector]
+    keyframe_ns = metadata_store.columns[FRAME_METADATA_KEYS.index("keyframe_n")][has_vector]
+
+    groups = {}
+    for position, video_id, keyframe_n in zip(
+        positions[has_vector].tolist(), video_ids.tolist(), keyframe_ns.tolist()
+    ):
+        groups.setdefault(video_id, []).append((keyframe_n or 0, position))
+    for video_id, frames in groups.items():
+        frames.sort()
+        video_positions[video_id] = np.array([p for _, p in frames], dtype=np.int64)
+    print(f"Per-video embedding positions indexed: {len(video_positions)} videos")
+
+
+def metadata_store_ready():
+    """True once the in-memory metadata store holds rows"""
+    return metadata_store is not None and len(metadata_store.ids) > 0
+
+
 def search_videos_embeddings(query_embedding, video_ids, top_k=10):
     """Search within specific videos' embeddings - Updated table name"""
     if not video_ids:
         return []
 
     # Ensure embedding is 2D float32
-    query_embedding = np.array(query_embedding).astype("float32")
-    if query_embedding.ndim == 1:
-        query_embedding = np.expand_dims(query_embedding, axis=0)
+    query_embedding = query_to_numpy(query_embedding)
     faiss.normalize_L2(query_embedding)
 
     all_embeddings = []
     all_ids = []
 
-    for video_id in video_ids:
-        video_embeddings, video_db_ids = get_video_embeddings(video_id)
+    # Memmap slices are cheap; only the SQLite fallback is worth fanning out
+    if video_positions or len(video_ids) == 1:
+        fetched = map(get_video_embeddings, video_ids)
+    else:
+        fetched = video_fetch_executor.map(get_video_embeddings, video_ids)
+
+    for video_id, (video_embeddings, video_db_ids) in zip(video_ids, fetched):
         if video_embeddings is not None and len(video_embeddings) > 0:
-            video_embeddings = np.array(video_embeddings).astype("float32")
             all_embeddings.append(video_embeddings)
             all_ids.extend(video_db_ids)
         else:
-            print(f"No embeddings found for video {video_id}")
+            trace(f"No embeddings found for video {video_id}")
 
     if not all_embeddings:
         return []
 
-    # Stack all embeddings into one array
-    embeddings_np = np.vstack(all_embeddings)
-    faiss.normalize_L2(embeddings_np)
-
-    # Build temporary FAISS index
-    temp_index = faiss.IndexFlatIP(embeddings_np.shape[1])
-    temp_index.add(embeddings_np)
+    # Cached per-video matrices are already float32 and L2-normalized
+    k = min(top_k, sum(len(e) for e in all_embeddings))
+    if isinstance(all_embeddings[0], torch.Tensor):
+        # Candidates are resident on the GPU: one matmul + topk
+        candidates = all_embeddings[0] if len(all_embeddings) == 1 else torch.cat(all_embeddings)
+        query = torch.from_numpy(query_embedding).to(device)
+        with torch.inference_mode():
+            top = torch.topk(candidates @ query[0], k)
+        scores = top.values.cpu().numpy()[None]
+        indices = top.indices.cpu().numpy()[None]
+    else:
+        if len(all_embeddings) == 1:
+            embeddings_np = all_embeddings[0]
+        else:
+            embeddings_np = np.vstack(all_embeddings)
 
-    # Perform search
-    scores, indices = temp_index.search(query_embedding, min(top_k, temp_index.ntotal))
+        # One exact k-NN pass over the candidates, no throwaway index to fill
+        scores, indices = faiss.knn(
+            query_embedding, embeddings_np, k, metric=faiss.METRIC_INNER_PRODUCT
+        )
 
     # Get corresponding DB IDs
-    matched_ids = [all_ids[i] for i in indices[0] if i != -1]
+    mask = indices[0] != -1
+    matched_ids = np.asarray(all_ids, dtype=np.int64)[indices[0][mask]].tolist()
     if not matched_ids:
         return []
 
-    # Query database - Updated table name
-    conn = get_db_connection()
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    placeholders = ",".join(["?" for _ in matched_ids])
-    sql = f"SELECT * FROM keyframe_embeddings WHERE id IN ({placeholders})"
-    cursor.execute(sql, matched_ids)
-    rows = cursor.fetchall()
-    conn.close()
-
-    # Map ID to row
-    id_to_row = {row["id"]: row for row in rows}
-
-    # Combine result with similarity
-    results = []
-    for rank, idx in enumerate(indices[0]):
-        if idx == -1:
-            continue
-        db_id = all_ids[idx]
-        row = id_to_row.get(db_id)
-        if row:
-            result = {
-                "id": row["id"],
-                "video_id": row["video_id"],
-                "keyframe_n": row["keyframe_n"],
-                "image_filename": row["image_filename"],
-                "image_path": row["image_path"],
-                "pts_time": row["pts_time"],
-                "fps": row["fps"],
-                "frame_idx": row["frame_idx"],
-                "video_title": row["video_title"],
-                "video_author": row["video_author"],
-                "video_description": row["video_description"],
-                "video_length": row["video_length"],
-                "publish_date": row["publish_date"],
-                "watch_url": row["watch_url"],
-                "thumbnail_url": row["thumbnail_url"],
-                "similarity": float(scores[0][rank]),
-            }
-            results.append(result)
-
-    results.sort(key=lambda x: x["similarity"], reverse=True)
-    return results[:top_k]
+    similarities = scores[0][mask].tolist()
+    if metadata_store_ready():
+        return metadata_store.lookup(matched_ids, similarities, top_k)
+    return fetch_ranked_metadata(matched_ids, similarities, top_k)
+
+
+def rerank_exact(queries, indices, k):
+    """Re-score candidate positions with exact fp32 inner products, keep top k"""
+    out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    out_indices = np.full((len(queries), k), -1, dtype=np.int64)
+    for i, (query, candidates) in enumerate(zip(queries, indices)):
+        candidates = candidates[candidates != -1]
+        vectors = embedding_matrix[candidates]
+        exact = vectors @ query
+        order = np.argsort(-exact)[:k]
+        out_scores[i, : len(order)] = exact[order]
+        out_indices[i, : len(order)] = candidates[order]
+    return out_scores, out_indices
+
+
+# Reusable (FAISS_MAX_BATCH, D) query matrix per search thread, so stacking
+# a batch copies each vector once and allocates nothing
+_query_buffer = threading.local()
+
+
+def stack_queries(items):
+    """Copy the batch's query vectors into the thread's buffer and L2-normalize in place"""
+    buf = getattr(_query_buffer, "buf", None)
+    if buf is None or len(buf) < len(items):
+        buf = np.empty((max(len(items), FAISS_MAX_BATCH), EMBEDDING_DIM), dtype=np.float32)
+        _query_buffer.buf = buf
+    queries = buf[: len(items)]
+    for row, (query, _) in zip(queries, items):
+        if isinstance(query, torch.Tensor):
+            query = query.detach().float().cpu().numpy()
+        np.copyto(row, np.asarray(query).reshape(-1))
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def faiss_search_batch(items):
+    """Run one FAISS search for a batch of (query_vector, k) items.
+
+    Queries are stacked into a single (B, D) matrix and normalized in one
+    pass; each item gets back its own (scores, indices) rows cut to its k.
+    """
+    max_k = max(k for _, k in items)
+    index = faiss_index
+    if faiss_index_gpu is not None and len(items) >= FAISS_GPU_MIN_BATCH:
+        index = faiss_index_gpu
+    rerank = FAISS_INDEX_TYPE in ("sq8", "ivfpq") and embedding_matrix is not None
+
+    on_device = all(isinstance(q, torch.Tensor) and q.is_cuda for q, _ in items)
+    if index is faiss_index_gpu and on_device and not rerank:
+        # GPU index fed straight from CLIP's output (faiss.contrib.torch_utils)
+        queries = torch.stack([q.reshape(-1) for q, _ in items])
+        queries = torch.nn.functional.normalize(queries, dim=-1)
+        scores, indices = index.search(queries, max_k)
+        scores, indices = scores.cpu().numpy(), indices.cpu().numpy()
+    else:
+        queries = stack_queries(items)
+        if rerank:
+            fetch_k = min(max_k * FAISS_RERANK_FACTOR, faiss_index.ntotal)
+            _, candidates = index.search(queries, fetch_k)
+            scores, indices = rerank_exact(queries, candidates, max_k)
+        else:
+            scores, indices = index.search(queries, max_k)
+    return [(scores[i : i + 1, :k], indices[i : i + 1, :k]) for i, (_, k) in enumerate(items)]
 
 
-def search_with_embedding(query_embedding, top_k=10, video_id=None):
+async def search_with_embedding(query_embedding, top_k=10, video_id=None):
     """Search using embedding vector in FAISS and return metadata from database - Updated table name"""
     if faiss_index is None or faiss_id_map is None:
         raise HTTPException(status_code=500, detail="FAISS index not available")
 
+    loop = asyncio.get_running_loop()
     if video_id:
         # Parse comma-separated video IDs
         video_ids = [vid.strip() for vid in video_id.split(",") if vid.strip()]
-        return search_videos_embeddings(query_embedding, video_ids, top_k)
-
-    # Ensure embedding is a 2D float32 numpy array
-    query_embedding = np.array(query_embedding).astype("float32")
-    if query_embedding.ndim == 1:
-        query_embedding = np.expand_dims(query_embedding, axis=0)
-
-    # Normalize the embedding
-    faiss.normalize_L2(query_embedding)
+        # SQLite reads and the per-video search block, keep them off the loop
+        return await loop.run_in_executor(
+            None, search_videos_embeddings, query_embedding, video_ids, top_k
+        )
 
-    # Perform search in FAISS index
+    # Perform search in FAISS index (coalesced with concurrent queries)
     search_k = min(top_k * 2, faiss_index.ntotal)
     if search_k == 0:
         return []  # nothing in index
-    scores, indices = faiss_index.search(query_embedding, search_k)
+    scores, indices = await faiss_batcher.submit((query_embedding, search_k))
 
-    # Extract valid FAISS result indices and map to DB IDs
-    db_ids = []
-    index_id_map = {}
-    for rank, faiss_idx in enumerate(indices[0]):
-        if faiss_idx != -1 and faiss_idx < len(faiss_id_map):
-            db_id = faiss_id_map[faiss_idx]
-            db_ids.append(db_id)
-            index_id_map[db_id] = rank  # to keep similarity mapping later
+    # Vectorized mapping of valid FAISS positions to DB IDs (FAISS rank order)
+    faiss_positions = indices[0]
+    mask = (faiss_positions != -1) & (faiss_positions < len(faiss_id_map))
+    db_ids = faiss_id_map[faiss_positions[mask]].tolist()
+    similarities = scores[0][mask].tolist()
 
     if not db_ids:
         return []
 
-    # Connect to the database
-    conn = get_db_connection()
-    conn.row_factory = sqlite3.Row  # to get dict-like rows
-    cursor = conn.cursor()
+    # Metadata in FAISS order (already by descending similarity), straight
+    # from memory when the store is loaded
+    if metadata_store_ready():
+        return metadata_store.lookup(db_ids, similarities, top_k)
+    return await loop.run_in_executor(
+        None, fetch_ranked_metadata, db_ids, similarities, top_k
+    )
 
-    # SQL query to get metadata - Updated table name
-    placeholders = ",".join(["?" for _ in db_ids])
-    sql = f"SELECT * FROM keyframe_embeddings WHERE id IN ({placeholders})"
-    params = db_ids
 
-    cursor.execute(sql, params)
-    rows = cursor.fetchall()
-    conn.close()
-
-    # Map results and attach similarity score
-    id_to_row = {row["id"]: row for row in rows}
-    results = []
-    for db_id in db_ids:
-        row = id_to_row.get(db_id)
-        if row:
-            rank = index_id_map[db_id]
-            result = {
-                "id": row["id"],
-                "video_id": row["video_id"],
-                "keyframe_n": row["keyframe_n"],
-                "image_filename": row["image_filename"],
-                "image_path": row["image_path"],
-                "pts_time": row["pts_time"],
-                "fps": row["fps"],
-                "frame_idx": row["frame_idx"],
-                "video_title": row["video_title"],
-                "video_author": row["video_author"],
-                "video_description": row["video_description"],
-                "video_length": row["video_length"],
-                "publish_date": row["publish_date"],
-                "watch_url": row["watch_url"],
-                "thumbnail_url": row["thumbnail_url"],
-                "similarity": float(scores[0][rank]),
-            }
-            results.append(result)
-
-    # Sort by similarity and return top_k
-    results.sort(key=lambda x: x["similarity"], reverse=True)
-    return results[:top_k]
+async def encode_text_cached(text):
+    """Encode a text query through the batcher, memoized in an LRU cache.
+
+    Keys are stripped and lowercased (CLIP's tokenizer lowercases anyway).
+    Cached arrays are read-only so no caller can mutate an entry in place.
+    """
+    key = text.strip().lower()
+    embedding = text_embedding_cache.get(key)
+    if embedding is not None:
+        text_embedding_cache.move_to_end(key)
+        return embedding
+
+    embedding = await text_batcher.submit(key)
+    if isinstance(embedding, np.ndarray):
+        embedding.setflags(write=False)
+    text_embedding_cache[key] = embedding
+    if len(text_embedding_cache) > TEXT_EMBEDDING_CACHE_SIZE:
+        text_embedding_cache.popitem(last=False)
+    return embedding
+
+
+def start_batchers():
+    """Start the CLIP encode and FAISS search micro-batchers on the running loop"""
+    global text_batcher, image_batcher, faiss_batcher
+    text_batcher = BatchScheduler(encode_texts, executor=clip_executor)
+    image_batcher = BatchScheduler(encode_images, executor=clip_executor)
+    faiss_batcher = BatchScheduler(
+        faiss_search_batch,
+        max_batch=FAISS_MAX_BATCH,
+        max_wait_ms=FAISS_MAX_WAIT_MS,
+        executor=faiss_executor,
+    )
+    text_batcher.start()
+    image_batcher.start()
+    faiss_batcher.start()
 
 
 # API Routes
@@ -430,6 +1381,17 @@ async def startup_event():
     """Initialize models and indexes on startup"""
     print("Starting up Image Retrieval System...")
 
+    # Checked once here instead of a stat() per request; sqlite3.connect
+    # would otherwise silently create an empty database
+    if not os.path.exists(DATABASE_FILE):
+        raise RuntimeError(
+            f"Database not found: {DATABASE_FILE}. Please run migration script first."
+        )
+    get_db_connection()
+
+    # Batchers first so search endpoints answer even if a later step fails
+    start_batchers()
+
     try:
         print("Loading CLIP model...")
         load_clip_model()
@@ -439,8 +1401,23 @@ async def startup_event():
         initialize_translator()
         print("✅ Translator initialized successfully")
 
+        print("Ensuring database indexes...")
+        snapshot_stale = metadata_table_stale()
+        if snapshot_stale:
+            print("keyframe_metadata is missing or stale, rebuilding...")
+        ensure_metadata_table(rebuild=snapshot_stale)
+        ensure_video_counts_table(rebuild=snapshot_stale)
+        ensure_db_indexes(refresh_stats=snapshot_stale)
+        print("✅ Database indexes ready")
+
         print("Building/Loading FAISS index...")
         build_faiss_index()
+        if faiss_index is not None:
+            move_faiss_index_to_gpu()
+
+        print("Loading metadata store...")
+        load_metadata_store()
+        build_video_positions()
         print("✅ FAISS index ready")
 
         print("🚀 Startup completed successfully!")
@@ -469,21 +1446,17 @@ async def health_check():
 
 
 @app.get("/test/frame/{frame_id}")
-async def test_frame(frame_id: int):
+def test_frame(frame_id: int):
     """Simple test endpoint for frame data - Updated table name"""
     try:
-        if not os.path.exists(DATABASE_FILE):
-            return {"error": "Database not found"}
-
         conn = get_db_connection()
         cursor = conn.cursor()
 
         cursor.execute(
-            "SELECT id, video_id, keyframe_n, image_filename FROM keyframe_embeddings WHERE id = ?",
+            "SELECT id, video_id, keyframe_n, image_filename FROM keyframe_metadata WHERE id = ?",
             (frame_id,),
         )
         row = cursor.fetchone()
-        conn.close()
 
         if not row:
             return {"error": "Frame not found"}
@@ -494,11 +1467,8 @@ async def test_frame(frame_id: int):
 
 
 @app.get("/debug/db")
-async def debug_database():
+def debug_database():
     """Debug database structure and sample data - Updated table name"""
-    if not os.path.exists(DATABASE_FILE):
-        return {"error": "Database file not found"}
-
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -509,16 +1479,14 @@ async def debug_database():
 
         # Get sample frame data
         cursor.execute(
-            "SELECT id, video_id, keyframe_n, image_filename FROM keyframe_embeddings LIMIT 5"
+            "SELECT id, video_id, keyframe_n, image_filename FROM keyframe_metadata LIMIT 5"
         )
         sample_frames = cursor.fetchall()
 
         # Get total count
-        cursor.execute("SELECT COUNT(*) FROM keyframe_embeddings")
+        cursor.execute("SELECT COUNT(*) FROM keyframe_metadata")
         total_count = cursor.fetchone()[0]
 
-        conn.close()
-
         return {
             "database_exists": True,
             "tables": [dict(t) for t in tables],
@@ -551,14 +1519,17 @@ async def search_by_text(
 
     # Translate query if requested
     if translate:
-        query, translated = translate_text(query, target_lang)
+        # googletrans is blocking HTTP; keep it off the event loop
+        query, translated = await asyncio.get_running_loop().run_in_executor(
+            None, translate_text, query, target_lang
+        )
 
     try:
-        # Encode text query
-        text_embedding = encode_text(query)
+        # Encode text query (cached, coalesced with concurrent requests)
+        text_embedding = await encode_text_cached(query)
 
         # Search
-        results = search_with_embedding(text_embedding, top_k, video_id)
+        results = await search_with_embedding(text_embedding, top_k, video_id)
 
         return {
             "original_query": original_query,
@@ -589,7 +1560,9 @@ async def translate_query(
         raise HTTPException(status_code=400, detail="Text cannot be empty")
 
     try:
-        translated_text, was_translated = translate_text(text, target_lang, source_lang)
+        translated_text, was_translated = await asyncio.get_running_loop().run_in_executor(
+            None, translate_text, text, target_lang, source_lang
+        )
 
         return {
             "original_text": text,
@@ -619,13 +1592,15 @@ async def search_by_image(
     try:
         # Read and process image
         image_data = await file.read()
-        image = Image.open(io.BytesIO(image_data)).convert("RGB")
+        image = await asyncio.get_running_loop().run_in_executor(
+            image_executor, load_query_image, image_data
+        )
 
-        # Encode image
-        image_embedding = encode_image(image)
+        # Encode image (coalesced with concurrent requests)
+        image_embedding = await image_batcher.submit(image)
 
         # Search
-        results = search_with_embedding(image_embedding, top_k, video_id)
+        results = await search_with_embedding(image_embedding, top_k, video_id)
 
         return {
             "filename": file.filename,
@@ -637,29 +1612,24 @@ async def search_by_image(
 
 
 @app.get("/frame/{frame_id}")
-async def get_frame_metadata(frame_id: int):
+def get_frame_metadata(frame_id: int):
     """Get metadata for a specific frame - Updated table name"""
     try:
-        if not os.path.exists(DATABASE_FILE):
-            raise HTTPException(status_code=500, detail="Database not found")
-
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        cursor.execute("SELECT * FROM keyframe_embeddings WHERE id = ?", (frame_id,))
+        cursor.execute(
+            f"SELECT {KEYFRAME_METADATA_COLUMNS} FROM keyframe_metadata WHERE id = ?",
+            (frame_id,),
+        )
         row = cursor.fetchone()
-        conn.close()
 
         if not row:
             raise HTTPException(status_code=404, detail="Frame not found")
 
-        # Convert to dict and exclude embedding data
-        frame_dict = {}
-        for key in row.keys():
-            if key != "embedding":  # Skip embedding data
-                frame_dict[key] = row[key]
+        frame_dict = dict(row)
 
-        print(f"Returning frame metadata for frame_id: {frame_id}")
+        trace(f"Returning frame metadata for frame_id: {frame_id}")
         return frame_dict
 
     except HTTPException as he:
@@ -672,31 +1642,33 @@ async def get_frame_metadata(frame_id: int):
 
 
 @app.get("/frames/surrounding/{frame_id}")
-async def get_surrounding_frames(
+def get_surrounding_frames(
     frame_id: int,
     window_size: int = Query(5, description="Number of frames before and after"),
 ):
     """Get surrounding frames for a specific frame - Updated table name"""
     try:
-        if not os.path.exists(DATABASE_FILE):
-            raise HTTPException(
-                status_code=500,
-                detail="Database not found. Please run migration script first.",
-            )
-
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        print(f"Getting surrounding frames for frame_id: {frame_id}")
+        trace(f"Getting surrounding frames for frame_id: {frame_id}")
 
-        # Get the target frame
-        print(f"Querying database for frame_id: {frame_id}")
-        cursor.execute("SELECT * FROM keyframe_embeddings WHERE id = ?", (frame_id,))
-        target_frame = cursor.fetchone()
-        print(f"Target frame result: {target_frame is not None}")
+        # Get the target frame (from memory when the store is loaded, so the
+        # range read below is the only SQL statement)
+        if metadata_store_ready():
+            target_frame = metadata_store.row(frame_id)
+        else:
+            trace(f"Querying database for frame_id: {frame_id}")
+            cursor.execute(
+                f"SELECT {KEYFRAME_METADATA_COLUMNS} FROM keyframe_metadata WHERE id = ?",
+                (frame_id,),
+            )
+            target_frame = cursor.fetchone()
+            if target_frame is not None:
+                target_frame = dict(target_frame)
+        trace(f"Target frame result: {target_frame is not None}")
 
         if not target_frame:
-            conn.close()
             raise HTTPException(
                 status_code=404, detail=f"Frame with ID {frame_id} not found"
             )
@@ -704,16 +1676,17 @@ async def get_surrounding_frames(
         video_id = target_frame["video_id"]
         target_keyframe_n = target_frame["keyframe_n"]
 
-        print(f"Target frame: video_id={video_id}, keyframe_n={target_keyframe_n}")
+        trace(f"Target frame: video_id={video_id}, keyframe_n={target_keyframe_n}")
 
         # Get surrounding frames from the same video
         start_keyframe = max(1, target_keyframe_n - window_size)
         end_keyframe = target_keyframe_n + window_size
 
+        cursor.row_factory = None  # plain tuples, unpacked positionally below
         cursor.execute(
             """
             SELECT keyframe_n, image_filename, image_path, pts_time 
-            FROM keyframe_embeddings 
+            FROM keyframe_metadata 
             WHERE video_id = ? AND keyframe_n BETWEEN ? AND ?
             ORDER BY keyframe_n
         """,
@@ -721,33 +1694,24 @@ async def get_surrounding_frames(
         )
 
         rows = cursor.fetchall()
-        conn.close()
 
         surrounding_frames = []
-        for row in rows:
+        for keyframe_n, image_filename, image_path, pts_time in rows:
             frame_dict = {
-                "keyframe_n": row["keyframe_n"],
-                "image_filename": row["image_filename"],
-                "image_path": row["image_path"],
-                "pts_time": row["pts_time"],
-                "is_current": (row["keyframe_n"] == target_keyframe_n),
+                "keyframe_n": keyframe_n,
+                "image_filename": image_filename,
+                "image_path": image_path,
+                "pts_time": pts_time,
+                "is_current": (keyframe_n == target_keyframe_n),
             }
             surrounding_frames.append(frame_dict)
 
-        # Convert target_frame to dict properly
-        target_frame_dict = {}
-        for key in target_frame.keys():
-            value = target_frame[key]
-            # Skip embedding data for response
-            if key != "embedding":
-                target_frame_dict[key] = value
-
         result = {
-            "target_frame": target_frame_dict,
+            "target_frame": target_frame,
             "surrounding_frames": surrounding_frames,
         }
 
-        print(f"Returning {len(surrounding_frames)} surrounding frames")
+        trace(f"Returning {len(surrounding_frames)} surrounding frames")
         return result
 
     except HTTPException as he:
@@ -763,34 +1727,29 @@ async def get_surrounding_frames(
 
 
 @app.get("/video/{video_id}/frames")
-async def get_video_frames(video_id: str):
+def get_video_frames(video_id: str):
     """Get all frames for a specific video - Updated table name"""
     try:
-        if not os.path.exists(DATABASE_FILE):
-            raise HTTPException(status_code=500, detail="Database not found")
-
         conn = get_db_connection()
         cursor = conn.cursor()
+        cursor.row_factory = None  # plain tuples, zipped with the keys below
 
         cursor.execute(
-            """
-            SELECT id, video_id, keyframe_n, image_filename, image_path, pts_time, 
-                   fps, frame_idx, video_title, video_author, video_description, 
-                   video_length, publish_date, watch_url, thumbnail_url
-            FROM keyframe_embeddings 
-            WHERE video_id = ? 
+            f"""
+            SELECT {KEYFRAME_METADATA_COLUMNS}
+            FROM keyframe_metadata
+            WHERE video_id = ?
             ORDER BY keyframe_n
         """,
             (video_id,),
         )
 
         rows = cursor.fetchall()
-        conn.close()
 
         if not rows:
             raise HTTPException(status_code=404, detail="Video not found")
 
-        return [dict(row) for row in rows]
+        return [dict(zip(KEYFRAME_METADATA_KEYS, row)) for row in rows]
 
     except HTTPException as he:
         raise he
@@ -802,26 +1761,24 @@ async def get_video_frames(video_id: str):
 
 
 @app.get("/stats")
-async def get_statistics():
+def get_statistics():
     """Get database statistics - Updated table name"""
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    cursor.execute("SELECT COUNT(*) as total_frames FROM keyframe_embeddings")
-    total_frames = cursor.fetchone()["total_frames"]
-
+    # One pass over the per-video counts instead of COUNT(DISTINCT) over
+    # every keyframe
     cursor.execute(
-        "SELECT COUNT(DISTINCT video_id) as total_videos FROM keyframe_embeddings"
+        "SELECT COALESCE(SUM(frame_count), 0) as total_frames, "
+        "COUNT(video_id) as total_videos FROM video_frame_counts"
     )
-    total_videos = cursor.fetchone()["total_videos"]
+    totals = cursor.fetchone()
+    total_frames = totals["total_frames"]
+    total_videos = totals["total_videos"]
 
-    cursor.execute(
-        "SELECT video_id, COUNT(*) as frame_count FROM keyframe_embeddings GROUP BY video_id LIMIT 10"
-    )
+    cursor.execute("SELECT video_id, frame_count FROM video_frame_counts LIMIT 10")
     top_videos = cursor.fetchall()
 
-    conn.close()
-
     return {
         "total_frames": total_frames,
         "total_videos": total_videos,
@@ -830,8 +1787,23 @@ async def get_statistics():
     }
 
 
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with long-lived browser caching.
+
+    Keyframe images never change for a given path, so thumbnails can be
+    cached as immutable and are not re-requested on every results page.
+    The body is still a FileResponse, which servers supporting the ASGI
+    zero-copy/pathsend extensions hand to the kernel's sendfile().
+    """
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
 # Serve static files (images) - Keep original path structure
-app.mount("/images", StaticFiles(directory="D:/keyframes"), name="images")
+app.mount("/images", CachedStaticFiles(directory="D:/keyframes"), name="images")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 if __name__ == "__main__":
@@ -7,8 +7,10 @@ import pandas as pd
 from tqdm import tqdm
 import json
 from pathlib import Path
+from functools import lru_cache
 import sqlite3
 import faiss # Import FAISS
+from torch.utils.data import Dataset, DataLoader
 
 # CLIP backend (Hugging Face)
 try:
@@ -17,30 +19,82 @@ try:
 except Exception:
     _HAS_CLIP = False
 
+# Optional torchvision decode/preprocess (falls back to PIL + CLIPProcessor)
+try:
+    from torchvision.io import read_image, ImageReadMode
+    from torchvision.transforms import v2
+    _HAS_TORCHVISION = True
+except Exception:
+    _HAS_TORCHVISION = False
+
 # --- Constants ---
 EMBEDDING_DIM = 1280  # Fixed dimension for CLIP ViT-bigG-14
 CLIP_MODEL_ID = "laion/CLIP-ViT-bigG-14-laion2B-39B-b160k"
 DATABASE_FILE = "keyframe_embeddings_clip.db"
 FAISS_INDEX_FILE = "keyframe_faiss_clip.index"
 FAISS_ID_MAP_FILE = "keyframe_faiss_map_clip.json"
+# Embedding BLOBs are written as fp16 (2560 bytes instead of 5120); reads
+# accept fp32 rows from older databases and widen everything to fp32
+EMBEDDING_STORAGE_DTYPE = np.float16
+
+# FAISS index type: "flat" (exact), "sqfp16" (exact scan over fp16 codes),
+# "hnsw" (graph ANN) or "ivfpq" (compressed ANN)
+FAISS_INDEX_TYPE = "ivfpq"
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVF_MAX_NLIST = 4096
+IVF_NPROBE = 32
+IVF_TRAIN_SAMPLE = 256  # Training vectors per IVF list
+IVFPQ_M = 64  # PQ sub-quantizers, i.e. bytes per vector code
+IVFPQ_MIN_VECTORS = 50_000  # Smaller collections keep an exact flat index
+FAISS_GPU_TEMP_MEMORY = 512 * 1024 * 1024  # Scratch space for GPU searches
+
+# Shared by every GPU clone; must outlive the indexes that use it
+_faiss_gpu_resources = None
 
 # Data paths
 KEYFRAMES_ROOT = "backend/keyframes"
 MEDIA_INFO_ROOT = "backend/media-info"
 MAP_KEYFRAMES_ROOT = "backend/map-keyframes"
 
+# Ingest pipeline: DataLoader workers decode + preprocess upcoming batches
+# while the GPU encodes the current one
+INGEST_NUM_WORKERS = min(8, os.cpu_count() or 1)
+INGEST_PREFETCH_FACTOR = 4
+# Fixed ingest batch: short batches are zero-padded up to it so the compiled
+# vision tower always sees one input shape
+INGEST_BATCH_SIZE = 8
+
+TEXT_EMBEDDING_CACHE_SIZE = 4096  # Text queries kept by the interactive search loop
+
 # --- Database Utility Functions (SQLite) ---
 def adapt_array(arr):
     return arr.tobytes()
 
 def convert_array(text):
+    if len(text) == EMBEDDING_DIM * 2:
+        return np.frombuffer(text, dtype=np.float16).astype(np.float32).reshape(-1, EMBEDDING_DIM)
     return np.frombuffer(text, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
 
 sqlite3.register_adapter(np.ndarray, adapt_array)
 sqlite3.register_converter("array", convert_array)
 
+# WAL + NORMAL sync: commits append to the WAL instead of fsyncing the main DB,
+# and readers (e.g. the FAISS build) don't block the ingest writer.
+# Call checkpoint_database() before exiting to fold the WAL back into the DB.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-262144",  # 256 MB
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",  # 256 MB
+)
+
 def setup_database(db_path=DATABASE_FILE):
     conn = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS keyframe_embeddings (
@@ -68,60 +122,79 @@ def setup_database(db_path=DATABASE_FILE):
     conn.commit()
     return conn
 
-def insert_keyframe_data_to_db(conn, keyframe_data):
-    cursor = conn.cursor()
+def checkpoint_database(conn):
+    """Flushes the WAL into the main database file and truncates it."""
     try:
-        cursor.execute('''
-            INSERT INTO keyframe_embeddings 
-            (video_id, keyframe_n, image_filename, image_path, pts_time, fps, frame_idx, embedding,
-             video_title, video_author, video_description, video_length, publish_date, watch_url, thumbnail_url)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            keyframe_data['video_id'],
-            keyframe_data['keyframe_n'],
-            keyframe_data['image_filename'],
-            keyframe_data['image_path'],
-            keyframe_data['pts_time'],
-            keyframe_data['fps'],
-            keyframe_data['frame_idx'],
-            keyframe_data['embedding'].astype(np.float32).reshape(1, -1),
-            keyframe_data['video_title'],
-            keyframe_data['video_author'],
-            keyframe_data['video_description'],
-            keyframe_data['video_length'],
-            keyframe_data['publish_date'],
-            keyframe_data['watch_url'],
-            keyframe_data['thumbnail_url']
-        ))
-        conn.commit()
-        return cursor.lastrowid
-    except sqlite3.IntegrityError:
-        cursor.execute("SELECT id FROM keyframe_embeddings WHERE image_path = ?", (keyframe_data['image_path'],))
-        row = cursor.fetchone()
-        return row[0] if row else None
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
     except Exception as e:
-        print(f"Error inserting keyframe data for {keyframe_data['image_path']}: {e}")
-        return None
+        print(f"Error checkpointing database: {e}")
+
+KEYFRAME_INSERT_SQL = '''
+    INSERT OR IGNORE INTO keyframe_embeddings
+    (video_id, keyframe_n, image_filename, image_path, pts_time, fps, frame_idx, embedding,
+     video_title, video_author, video_description, video_length, publish_date, watch_url, thumbnail_url)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def keyframe_row(keyframe_data):
+    """Builds the parameter tuple for KEYFRAME_INSERT_SQL from a keyframe dict."""
+    return (
+        keyframe_data['video_id'],
+        keyframe_data['keyframe_n'],
+        keyframe_data['image_filename'],
+        keyframe_data['image_path'],
+        keyframe_data['pts_time'],
+        keyframe_data['fps'],
+        keyframe_data['frame_idx'],
+        keyframe_data['embedding'].astype(EMBEDDING_STORAGE_DTYPE).reshape(1, -1),
+        keyframe_data['video_title'],
+        keyframe_data['video_author'],
+        keyframe_data['video_description'],
+        keyframe_data['video_length'],
+        keyframe_data['publish_date'],
+        keyframe_data['watch_url'],
+        keyframe_data['thumbnail_url']
+    )
+
+def insert_keyframe_batch_to_db(conn, keyframe_data_list):
+    """Inserts a whole batch of keyframes in a single transaction (one commit per batch)."""
+    rows = [keyframe_row(keyframe_data) for keyframe_data in keyframe_data_list]
+    if not rows:
+        return 0
+    try:
+        with conn:
+            cursor = conn.executemany(KEYFRAME_INSERT_SQL, rows)
+        return cursor.rowcount
+    except Exception as e:
+        print(f"[Batch] Error inserting {len(rows)} keyframes: {e}")
+        return 0
 
 def get_all_embeddings_and_db_ids(conn):
     """Fetches all embeddings and their corresponding database IDs."""
     cursor = conn.cursor()
-    cursor.execute("SELECT id, embedding FROM keyframe_embeddings")
-    data = []
-    for row in cursor.fetchall():
-        db_id = row[0]
-        embedding_array = row[1] # Already converted by SQLite type converter
-        if embedding_array is not None and embedding_array.shape == (1, EMBEDDING_DIM):
-            data.append({'db_id': db_id, 'embedding': embedding_array.squeeze()})
-        elif embedding_array is not None : # Handle potential old format if any
-             data.append({'db_id': db_id, 'embedding': embedding_array}) # assume it's already 1D
-    
-    if not data:
+    cursor.execute("SELECT COUNT(*) FROM keyframe_embeddings WHERE embedding IS NOT NULL")
+    n = cursor.fetchone()[0]
+    if n == 0:
         return [], np.array([], dtype=np.float32)
 
-    db_ids = [item['db_id'] for item in data]
-    embeddings = np.array([item['embedding'] for item in data]).astype(np.float32)
-    return db_ids, embeddings
+    # Decode each BLOB straight into its row of one preallocated matrix;
+    # CAST bypasses the "array" converter so no per-row array is allocated
+    ids = np.empty(n, dtype=np.int64)
+    embeddings = np.empty((n, EMBEDDING_DIM), dtype=np.float32)
+    count = 0
+    cursor.execute(
+        "SELECT id, CAST(embedding AS BLOB) FROM keyframe_embeddings "
+        "WHERE embedding IS NOT NULL ORDER BY id"
+    )
+    for db_id, blob in cursor:
+        if count == n:
+            break
+        dtype = np.float16 if len(blob) == EMBEDDING_DIM * 2 else np.float32
+        ids[count] = db_id
+        embeddings[count] = np.frombuffer(blob, dtype=dtype)
+        count += 1
+
+    return ids[:count].tolist(), embeddings[:count]
 
 
 def get_metadata_for_db_ids(conn, db_ids_list):
@@ -165,6 +238,83 @@ def check_if_keyframe_exists_in_db(conn, image_path_to_check):
     return count > 0
 
 # --- FAISS Utility Functions ---
+def create_faiss_index(embeddings_np):
+    """Create and fill a FAISS index of FAISS_INDEX_TYPE over normalized vectors"""
+    n, d = embeddings_np.shape
+
+    if FAISS_INDEX_TYPE == "ivfpq":
+        if n >= IVFPQ_MIN_VECTORS and d % IVFPQ_M == 0:
+            nlist = min(IVF_MAX_NLIST, max(1, int(4 * np.sqrt(n))))
+            quantizer = faiss.IndexFlatIP(d)
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, IVFPQ_M, 8, faiss.METRIC_INNER_PRODUCT)
+            sample_size = min(n, nlist * IVF_TRAIN_SAMPLE)
+            sample = embeddings_np[np.random.default_rng(0).choice(n, sample_size, replace=False)]
+            print(f"Training IVFPQ (nlist={nlist}, m={IVFPQ_M}) on {sample_size} vectors")
+            index.train(sample)
+            index.add(embeddings_np)
+            return index
+        print(f"Only {n} vectors, using an exact flat index instead of IVFPQ")
+
+    elif FAISS_INDEX_TYPE == "sqfp16":
+        # 2 bytes per dimension: half the RAM and scan bandwidth of IndexFlatIP
+        index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+        index.train(embeddings_np)
+        index.add(embeddings_np)
+        return index
+
+    elif FAISS_INDEX_TYPE == "hnsw":
+        index = faiss.IndexHNSWFlat(d, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.add(embeddings_np)
+        return index
+
+    index = faiss.IndexFlatIP(d)  # Inner product for cosine similarity
+    index.add(embeddings_np)
+    return index
+
+def configure_faiss_index(index):
+    """Apply query-time search parameters for ANN indexes"""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = IVF_NPROBE
+
+def gpu_cloner_options():
+    """Cloner options that let the IVFPQ built here fit GPU IVFPQ limits.
+
+    fp16 PQ lookup tables halve their shared-memory footprint (m=64 with
+    8-bit codes needs 64 KB in fp32, over the 48 KB limit), and precomputed
+    tables cover sub-quantizer widths the direct kernels don't support.
+    """
+    co = faiss.GpuClonerOptions()
+    co.useFloat16 = True
+    co.usePrecomputed = True
+    return co
+
+def move_faiss_index_to_gpu(index):
+    """Clone index onto GPU 0 when faiss-gpu and a GPU are present.
+
+    Returns the CPU index unchanged otherwise, or for index types FAISS
+    cannot clone to GPU (e.g. HNSW). Files are always written from the CPU
+    index, so the GPU clone never needs converting back.
+    """
+    global _faiss_gpu_resources
+    if index is None or not hasattr(faiss, "StandardGpuResources") or faiss.get_num_gpus() == 0:
+        return index
+    try:
+        if _faiss_gpu_resources is None:
+            _faiss_gpu_resources = faiss.StandardGpuResources()
+            _faiss_gpu_resources.setTempMemory(FAISS_GPU_TEMP_MEMORY)
+        gpu_index = faiss.index_cpu_to_gpu(_faiss_gpu_resources, 0, index, gpu_cloner_options())
+        if isinstance(index, faiss.IndexIVF):
+            # The clone does not reliably carry query-time parameters over
+            faiss.GpuParameterSpace().set_index_parameter(gpu_index, "nprobe", IVF_NPROBE)
+        print(f"FAISS index moved to GPU: {gpu_index.ntotal} vectors")
+        return gpu_index
+    except Exception as e:
+        print(f"Keeping FAISS index on CPU: {e}")
+        return index
+
 def build_and_save_faiss_index(db_conn, index_path=FAISS_INDEX_FILE, map_path=FAISS_ID_MAP_FILE):
     print("Building FAISS index from database...")
     db_ids, embeddings_np = get_all_embeddings_and_db_ids(db_conn)
@@ -179,8 +329,8 @@ def build_and_save_faiss_index(db_conn, index_path=FAISS_INDEX_FILE, map_path=FA
     # Normalize embeddings for IndexFlatIP (cosine similarity)
     faiss.normalize_L2(embeddings_np)
 
-    index = faiss.IndexFlatIP(EMBEDDING_DIM)
-    index.add(embeddings_np)
+    index = create_faiss_index(embeddings_np)
+    configure_faiss_index(index)
     
     print(f"FAISS index built with {index.ntotal} vectors.")
     faiss.write_index(index, index_path)
@@ -201,6 +351,7 @@ def load_faiss_index_and_map(index_path=FAISS_INDEX_FILE, map_path=FAISS_ID_MAP_
         return None, None
     try:
         index = faiss.read_index(index_path)
+        configure_faiss_index(index)
         print(f"FAISS index loaded from {index_path} with {index.ntotal} vectors.")
         with open(map_path, 'r') as f:
             faiss_to_db_id_map = json.load(f)
@@ -211,30 +362,37 @@ def load_faiss_index_and_map(index_path=FAISS_INDEX_FILE, map_path=FAISS_ID_MAP_
         return None, None
 
 # --- Embedding and Search Functions ---
-def process_keyframe_batch(conn, batch_images, batch_keyframe_data, model, processor, device):
-    if not batch_images:
+def clip_autocast(device):
+    """FP16 autocast for CLIP forwards on CUDA (no-op on CPU)"""
+    return torch.autocast("cuda", dtype=torch.float16, enabled=(device == "cuda"))
+
+def process_pixel_batch(conn, pixel_values, batch_keyframe_data, model, device, pad_to=None):
+    """Encodes an already-preprocessed pixel batch and inserts it into the DB.
+
+    With pad_to, a short batch (the last one, or one with failed decodes) is
+    zero-padded to that size and the padding rows are dropped afterwards.
+    """
+    if not batch_keyframe_data:
         return 0
     try:
-        # CLIP preprocess and features
-        # Process all images in the batch at once
-        inputs = processor(images=batch_images, return_tensors='pt', padding=True)
-        inputs = {k: v.to(device) for k, v in inputs.items()}
+        pixel_values = pixel_values.to(device, non_blocking=True)
+        if pad_to is not None and pixel_values.shape[0] < pad_to:
+            padding = pixel_values.new_zeros((pad_to - pixel_values.shape[0], *pixel_values.shape[1:]))
+            pixel_values = torch.cat([pixel_values, padding])
         
-        with torch.no_grad():
+        with torch.inference_mode(), clip_autocast(device):
             try:
-                image_features = model.get_image_features(**inputs)
+                # fp32 before normalizing so stored embeddings stay full precision
+                image_features = model.get_image_features(pixel_values=pixel_values).float()
                 image_features = image_features / image_features.norm(dim=-1, keepdim=True)
                 embeddings_np = image_features.cpu().detach().numpy()
             except Exception as e:
                 print(f"[Batch] Error extracting embeddings: {e}")
                 return 0
                 
-        count = 0
         for i, keyframe_data in enumerate(batch_keyframe_data):
             keyframe_data['embedding'] = embeddings_np[i]
-            insert_keyframe_data_to_db(conn, keyframe_data)
-            count += 1
-        return count
+        return insert_keyframe_batch_to_db(conn, batch_keyframe_data)
     except Exception as e:
         print(f"[Batch] Error processing keyframe batch: {e}")
         return 0
@@ -276,7 +434,63 @@ def load_keyframe_mapping(video_id):
         print(f"Error loading keyframe mapping for {video_id}: {e}")
         return {}
 
-def ingest_keyframes_to_db(db_conn, model, processor, device, force_reingest_all=False, batch_size=8):
+def build_clip_transforms(processor):
+    """Mirror CLIPProcessor's image pipeline with torchvision ops.
+
+    Returns (resize_crop, normalize): resize_crop runs on uint8 tensors in the
+    DataLoader workers so batches can be stacked and shipped as uint8, and
+    normalize runs on the stacked batch on device. Both are None when
+    torchvision is unavailable.
+    """
+    if not _HAS_TORCHVISION:
+        return None, None
+    image_processor = processor.image_processor
+    crop = image_processor.crop_size
+    resize_crop = v2.Compose([
+        v2.Resize(image_processor.size["shortest_edge"], interpolation=v2.InterpolationMode.BICUBIC, antialias=True),
+        v2.CenterCrop((crop["height"], crop["width"])),
+    ])
+    normalize = v2.Compose([
+        v2.ToDtype(torch.float32, scale=True),
+        v2.Normalize(mean=image_processor.image_mean, std=image_processor.image_std),
+    ])
+    return resize_crop, normalize
+
+class KeyframeDataset(Dataset):
+    """Decodes and preprocesses keyframes in DataLoader workers."""
+
+    def __init__(self, keyframe_data_list, processor, resize_crop=None):
+        self.keyframe_data_list = keyframe_data_list
+        self.processor = processor
+        self.resize_crop = resize_crop
+
+    def __len__(self):
+        return len(self.keyframe_data_list)
+
+    def __getitem__(self, idx):
+        keyframe_data = self.keyframe_data_list[idx]
+        try:
+            if self.resize_crop is not None:
+                # uint8 (3, H, W); normalized on device after stacking
+                image = read_image(keyframe_data['image_path'], mode=ImageReadMode.RGB)
+                pixel_values = self.resize_crop(image)
+            else:
+                image = Image.open(keyframe_data['image_path']).convert('RGB')
+                pixel_values = self.processor(images=image, return_tensors='pt')['pixel_values'][0]
+        except Exception as e:
+            print(f"Error loading {keyframe_data['image_path']}: {e}")
+            return None, keyframe_data
+        return pixel_values, keyframe_data
+
+def collate_keyframes(batch):
+    """Stacks decoded keyframes, dropping the ones that failed to load."""
+    ok = [item for item in batch if item[0] is not None]
+    error_count = len(batch) - len(ok)
+    if not ok:
+        return None, [], error_count
+    return torch.stack([item[0] for item in ok]), [item[1] for item in ok], error_count
+
+def ingest_keyframes_to_db(db_conn, model, processor, device, force_reingest_all=False, batch_size=INGEST_BATCH_SIZE):
     """Process all video keyframes from the keyframes directory structure"""
     if not os.path.exists(KEYFRAMES_ROOT):
         print(f"Error: Keyframes directory not found: {KEYFRAMES_ROOT}")
@@ -295,74 +509,73 @@ def ingest_keyframes_to_db(db_conn, model, processor, device, force_reingest_all
     print(f"Found {total_videos} video directories")
     
     model.eval()
-    batch_images = []
-    batch_keyframe_data = []
+    pending_keyframes = []
     
-    with torch.no_grad():
-        for video_id in tqdm(video_dirs, desc="Processing videos"):
-            # Load video metadata and keyframe mapping
-            video_metadata = load_video_metadata(video_id)
-            keyframe_mapping = load_keyframe_mapping(video_id)
-            
-            video_dir = os.path.join(KEYFRAMES_ROOT, video_id)
-            keyframe_files = sorted([f for f in os.listdir(video_dir) if f.endswith('.jpg')])
-            
-            for keyframe_file in keyframe_files:
-                try:
-                    # Extract keyframe number from filename (e.g., "001.jpg" -> 1)
-                    keyframe_n = int(keyframe_file.split('.')[0])
-                    image_path = os.path.join(video_dir, keyframe_file)
-                    
-                    total_keyframes_processed += 1
-                    
-                    # Skip if already exists
-                    if not force_reingest_all and check_if_keyframe_exists_in_db(db_conn, image_path):
-                        skipped_count += 1
-                        continue
-                    
-                    # Get keyframe timing info
-                    timing_info = keyframe_mapping.get(keyframe_n, {
-                        'pts_time': 0.0, 'fps': 30.0, 'frame_idx': 0
-                    })
-                    
-                    # Load and preprocess image
-                    image = Image.open(image_path).convert('RGB')
-                    
-                    # Prepare keyframe data
-                    keyframe_data = {
-                        'video_id': video_id,
-                        'keyframe_n': keyframe_n,
-                        'image_filename': keyframe_file,
-                        'image_path': image_path,
-                        'pts_time': timing_info['pts_time'],
-                        'fps': timing_info['fps'],
-                        'frame_idx': timing_info['frame_idx'],
-                        'video_title': video_metadata.get('title', ''),
-                        'video_author': video_metadata.get('author', ''),
-                        'video_description': video_metadata.get('description', ''),
-                        'video_length': video_metadata.get('length', 0),
-                        'publish_date': video_metadata.get('publish_date', ''),
-                        'watch_url': video_metadata.get('watch_url', ''),
-                        'thumbnail_url': video_metadata.get('thumbnail_url', ''),
-                    }
-                    
-                    batch_images.append(image)
-                    batch_keyframe_data.append(keyframe_data)
-                    
-                    # Process batch when full
-                    if len(batch_images) == batch_size:
-                        inserted = process_keyframe_batch(db_conn, batch_images, batch_keyframe_data, model, processor, device)
-                        newly_inserted_count += inserted
-                        batch_images = []
-                        batch_keyframe_data = []
-                        
-                except Exception as e:
-                    error_count += 1
-                    print(f"Error processing {video_id}/{keyframe_file}: {e}")
+    for video_id in tqdm(video_dirs, desc="Scanning videos"):
+        # Load video metadata and keyframe mapping
+        video_metadata = load_video_metadata(video_id)
+        keyframe_mapping = load_keyframe_mapping(video_id)
+        
+        video_dir = os.path.join(KEYFRAMES_ROOT, video_id)
+        keyframe_files = sorted([f for f in os.listdir(video_dir) if f.endswith('.jpg')])
         
-        # Process remaining batch
-        if batch_images:
-            inserted = process_keyframe_batch(db_conn, batch_images, batch_keyframe_data, model, processor, device)
+        for keyframe_file in keyframe_files:
+            try:
+                # Extract keyframe number from filename (e.g., "001.jpg" -> 1)
+                keyframe_n = int(keyframe_file.split('.')[0])
+                image_path = os.path.join(video_dir, keyframe_file)
+                
+                total_keyframes_processed += 1
+                
+                # Skip if already exists
+                if not force_reingest_all and check_if_keyframe_exists_in_db(db_conn, image_path):
+                    skipped_count += 1
+                    continue
+                
+                # Get keyframe timing info
+                timing_info = keyframe_mapping.get(keyframe_n, {
+                    'pts_time': 0.0, 'fps': 30.0, 'frame_idx': 0
+                })
+                
+                # Prepare keyframe data (image is decoded later by the DataLoader)
+                pending_keyframes.append({
+                    'video_id': video_id,
+                    'keyframe_n': keyframe_n,
+                    'image_filename': keyframe_file,
+                    'image_path': image_path,
+                    'pts_time': timing_info['pts_time'],
+                    'fps': timing_info['fps'],
+                    'frame_idx': timing_info['frame_idx'],
+                    'video_title': video_metadata.get('title', ''),
+                    'video_author': video_metadata.get('author', ''),
+                    'video_description': video_metadata.get('description', ''),
+                    'video_length': video_metadata.get('length', 0),
+                    'publish_date': video_metadata.get('publish_date', ''),
+                    'watch_url': video_metadata.get('watch_url', ''),
+                    'thumbnail_url': video_metadata.get('thumbnail_url', ''),
+                })
+                    
+            except Exception as e:
+                error_count += 1
+                print(f"Error processing {video_id}/{keyframe_file}: {e}")
+    
+    if pending_keyframes:
+        resize_crop, normalize = build_clip_transforms(processor)
+        loader = DataLoader(
+            KeyframeDataset(pending_keyframes, processor, resize_crop),
+            batch_size=batch_size,
+            num_workers=INGEST_NUM_WORKERS,
+            pin_memory=(device == "cuda"),
+            prefetch_factor=INGEST_PREFETCH_FACTOR if INGEST_NUM_WORKERS > 0 else None,
+            collate_fn=collate_keyframes,
+        )
+        for pixel_values, batch_keyframe_data, batch_errors in tqdm(loader, desc="Encoding keyframes"):
+            error_count += batch_errors
+            if pixel_values is None:
+                continue
+            if normalize is not None:
+                pixel_values = normalize(pixel_values.to(device, non_blocking=True))
+            inserted = process_pixel_batch(db_conn, pixel_values, batch_keyframe_data, model, device, pad_to=batch_size)
             newly_inserted_count += inserted
     
     print(f"\nTổng kết:")
@@ -376,6 +589,48 @@ def ingest_keyframes_to_db(db_conn, model, processor, device, force_reingest_all
 
 
 
+def tokenize_text_query(processor, query):
+    """Tokenize to the full context length so the text tower sees one shape"""
+    return processor(text=[query], return_tensors='pt', padding='max_length',
+                     max_length=processor.tokenizer.model_max_length, truncation=True)
+
+def warmup_clip(model, processor, device, batch_size=INGEST_BATCH_SIZE):
+    """Run the compiled towers at their steady-state shapes before real work.
+
+    reduce-overhead records a CUDA graph per input shape on the first calls,
+    so this moves compilation and capture out of the first ingest batch and
+    the first text query.
+    """
+    crop = processor.image_processor.crop_size
+    pixel_values = torch.zeros((batch_size, 3, crop["height"], crop["width"]), device=device)
+    text_inputs = {k: v.to(device) for k, v in tokenize_text_query(processor, "warm up").items()}
+    with torch.inference_mode(), clip_autocast(device):
+        for _ in range(3):
+            model.get_image_features(pixel_values=pixel_values)
+            model.get_text_features(**text_inputs)
+    torch.cuda.synchronize()
+
+def make_text_encoder(model, processor, device):
+    """Returns an LRU-cached query -> (1, D) fp32 L2-normalized embedding function.
+
+    Queries are keyed after strip() + lower(), so repeated searches skip the
+    text tower entirely. Vectors are cached as bytes and decoded on each hit,
+    so callers can't mutate the cached copy.
+    """
+    @lru_cache(maxsize=TEXT_EMBEDDING_CACHE_SIZE)
+    def _encode(query):
+        inputs = tokenize_text_query(processor, query)
+        inputs = {k: v.to(device) for k, v in inputs.items()}
+        with torch.inference_mode(), clip_autocast(device):
+            text_emb = model.get_text_features(**inputs).float()
+            text_emb = text_emb / text_emb.norm(dim=-1, keepdim=True)
+        return text_emb.cpu().numpy().astype(np.float32).tobytes()
+
+    def encode_text(query):
+        return np.frombuffer(_encode(query.strip().lower()), dtype=np.float32).reshape(1, -1).copy()
+
+    return encode_text
+
 def search_images_by_image_faiss(query_image_path, faiss_index, faiss_to_db_id_map, db_conn, model, processor, device, top_k=5):
     if not Path(query_image_path).exists():
         print(f"Query image not found: {query_image_path}")
@@ -385,14 +640,14 @@ def search_images_by_image_faiss(query_image_path, faiss_index, faiss_to_db_id_m
         return []
 
     model.eval()
-    with torch.no_grad():
+    with torch.inference_mode(), clip_autocast(device):
         try:
             image = Image.open(query_image_path).convert('RGB')
             inputs = processor(images=image, return_tensors='pt')
             inputs = {k: v.to(device) for k, v in inputs.items()}
             
             # Extract embeddings using CLIP
-            query_image_embedding = model.get_image_features(**inputs)
+            query_image_embedding = model.get_image_features(**inputs).float()
             query_image_embedding = query_image_embedding / query_image_embedding.norm(dim=-1, keepdim=True)  # Normalize
             query_image_embedding = query_image_embedding.cpu().numpy()
                 
@@ -473,6 +728,16 @@ def main():
         model = CLIPModel.from_pretrained(CLIP_MODEL_ID)
         model = model.to(device)
         model.eval()
+        if device == "cuda" and hasattr(torch, "compile"):
+            # Compile the towers only: get_image_features/get_text_features
+            # still dispatch through the eager wrapper. Both use CUDA graphs;
+            # ingest batches are padded to INGEST_BATCH_SIZE and text queries
+            # to the context length, so each tower replays a single graph
+            # (image queries in option 1 capture one more, at batch size 1)
+            model.vision_model = torch.compile(model.vision_model, mode="reduce-overhead", fullgraph=False)
+            model.text_model = torch.compile(model.text_model, mode="reduce-overhead", fullgraph=False)
+            print("Warming up compiled CLIP towers...")
+            warmup_clip(model, processor, device)
         print(f"✅ CLIP ViT-bigG loaded. Embedding dim: {EMBEDDING_DIM}")
     except Exception as e:
         print(f"Error loading CLIP: {e}")
@@ -501,10 +766,13 @@ def main():
         print("Loading existing FAISS index and map...")
         faiss_index, faiss_id_map = load_faiss_index_and_map(index_path=index_file, map_path=map_file)
 
+    faiss_index = move_faiss_index_to_gpu(faiss_index)
+
     if faiss_index is None or faiss_id_map is None or faiss_index.ntotal == 0:
         print("Failed to load or build a valid FAISS index. Search will not be available.")
     else:
         print(f"FAISS setup complete. Index has {faiss_index.ntotal} vectors.")
+        encode_text = make_text_encoder(model, processor, device)
         
         # --- Interactive Image Search Loop ---
         print("\n" + "="*50)
@@ -572,12 +840,7 @@ def main():
                     print("Empty query")
                     continue
                 try:
-                    inputs = processor(text=[text_query], return_tensors='pt', padding=True)
-                    inputs = {k: v.to(device) for k, v in inputs.items()}
-                    with torch.no_grad():
-                        text_emb = model.get_text_features(**inputs)
-                        text_emb = text_emb / text_emb.norm(dim=-1, keepdim=True)
-                        text_np = text_emb.cpu().numpy().astype(np.float32)
+                    text_np = encode_text(text_query)
                     faiss.normalize_L2(text_np)
                     distances, faiss_indices = faiss_index.search(text_np, 10)
                     if faiss_indices.size == 0 or faiss_indices[0][0] == -1:
@@ -606,6 +869,7 @@ def main():
                     ingest_keyframes_to_db(db_conn, model, processor, device, force_reingest_all=True)
                     print("Rebuilding FAISS index...")
                     faiss_index, faiss_id_map = build_and_save_faiss_index(db_conn, index_file, map_file)
+                    faiss_index = move_faiss_index_to_gpu(faiss_index)
                     print("✅ Database rebuild completed.")
                     
             elif choice == '3':
@@ -641,6 +905,7 @@ def main():
                             print("\nRebuilding FAISS index...")
                             rebuild_progress = tqdm(total=1, desc="Rebuilding index")
                             faiss_index, faiss_id_map = build_and_save_faiss_index(db_conn, index_file, map_file)
+                            faiss_index = move_faiss_index_to_gpu(faiss_index)
                             rebuild_progress.update(1)
                             rebuild_progress.close()
                             print("✅ FAISS index rebuilt successfully.")
@@ -651,6 +916,7 @@ def main():
             else:
                 print("❌ Invalid option. Please try again.")
     
+    checkpoint_database(db_conn)
     db_conn.close()
     print("Exited.")
 